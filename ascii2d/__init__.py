@@ -1 +1 @@
-from .ascii2d import Ascii2d, Ascii2dConfig, Ascii2dResult, OriginType, SortOrder
\ No newline at end of file
+from .ascii2d import Ascii2d, Ascii2dConfig, Ascii2dResult, OriginType, SortOrder, UploadMode
\ No newline at end of file
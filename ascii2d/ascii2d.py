@@ -1,46 +1,73 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
 from enum import Enum
 from io import BytesIO
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING
 from urllib.parse import parse_qs, urlparse
 
 import asyncio_atexit
 from aiohttp import ClientSession
-from bs4 import BeautifulSoup, Tag
-from PicImageSearch.ascii2d import Ascii2D as PISAscii2d
 
 from origins import OriginType
+from searcher import Searcher, UploadMode, rank_by_geometry, read_upload
+from utils import MemoryBudget, file_image_cost
 
+if TYPE_CHECKING:
+    from bs4 import Tag
 
-class Ascii2d:
-    def __init__(self, config: Ascii2dConfig) -> None:
+    from ascii2d.pis import PISAscii2dExtend
+
+
+class Ascii2d(Searcher):
+    def __init__(self, config: Ascii2dConfig, budget: MemoryBudget = None) -> None:
         self.config = config
+        self.budget = budget if budget is not None else MemoryBudget()
         self.session = None
-        self.__internal = PISAscii2dExtend()
+        self.__network = None
+        self.__internal = None
 
     async def search(self, img_path: str | Path, md5: str = None) -> list[Ascii2dResult]:
-        result = None
+        internal = await self.__get_internal()
+        result = list[Ascii2dResult]()
         if md5 is not None:
-            resp_text_md5, _ = await self.__internal.search_md5_raw(md5)
+            resp_text_md5, _ = await internal.search_md5_raw(md5)
             result = self.__parse_ascii2d_resp(resp_text_md5)
         if len(result) > 0:
             self.__sort_result(result)
             return result
         else:
-            resp_text, _ = await self.__internal.search_raw(file=img_path)
+            match self.config.upload_mode:
+                case UploadMode.Original:
+                    cost = Path(img_path).stat().st_size
+                case UploadMode.Downscale:
+                    cost = await asyncio.to_thread(file_image_cost, img_path)
+            async with self.budget.reserve(cost):
+                file = await asyncio.to_thread(read_upload, img_path, self.config.upload_mode, self.config.upload_max_size, self.config.upload_quality)
+                resp_text, _ = await internal.search_raw(file=file)
             result = self.__parse_ascii2d_resp(resp_text)
         self.__sort_result(result)
         return result
 
+    async def __get_internal(self) -> PISAscii2dExtend:
+        if self.__internal is None:
+            from PicImageSearch.network import Network
+
+            from ascii2d.pis import PISAscii2dExtend
+
+            self.__network = Network()
+            self.__internal = PISAscii2dExtend(self.config.base_url, client=self.__network.start())
+            asyncio_atexit.register(self.__cleanup_internal)
+        return self.__internal
+
     async def __get_session(self) -> ClientSession:
         if self.session is None:
             self.session = ClientSession()
             if self.config.user_agent is not None:
                 self.session.headers.update({'user-agent': self.config.user_agent})
-        asyncio_atexit.register(self.__cleanup)
+            asyncio_atexit.register(self.__cleanup)
         return self.session
 
     def __sort_result(self, results: list[Ascii2dResult]):
@@ -53,12 +80,14 @@ class Ascii2d:
                 results.sort(key=lambda r: r.image_size, reverse=True)
 
     def __parse_ascii2d_resp(self, resp_text: str) -> list[Ascii2dResult]:
+        from bs4 import BeautifulSoup
+
         soup = BeautifulSoup(resp_text, 'lxml')
         rs = soup.find_all(attrs={'class': 'item-box'})
         results = list[Ascii2dResult]()
         for r in rs:
             try:
-                parsed = parse_ascii2d_result(r)
+                parsed = parse_ascii2d_result(r, self.config.base_url)
                 results.append(parsed)
             except Ascii2dParseError:
                 continue
@@ -67,12 +96,8 @@ class Ascii2d:
         self.__sort_result(results)
         return results
 
-    def get_prefered_results(
-        self, results: list[Ascii2dResult]
-    ) -> tuple[list[Ascii2dResult], list[Ascii2dResult]]:
-        pref = [r for r in results if r.origin == self.config.prefered]
-        non_pref = [r for r in results if not r.origin == self.config.prefered]
-        return pref, non_pref
+    def rank_results(self, results: list[Ascii2dResult], width: int, height: int) -> list[Ascii2dResult]:
+        return rank_by_geometry(results, width, height, self.config.prefered, self.config.aspect_tolerance)
 
     async def fetch_thumbnail(self, target: Ascii2dResult) -> BytesIO:
         session = await self.__get_session()
@@ -84,8 +109,12 @@ class Ascii2d:
         if self.session is not None:
             await self.session.close()
 
+    async def __cleanup_internal(self):
+        if self.__network is not None:
+            await self.__network.close()
 
-def parse_ascii2d_result(item_box: Tag) -> Ascii2dResult:
+
+def parse_ascii2d_result(item_box: Tag, base_url: str = 'https://ascii2d.net') -> Ascii2dResult:
     try:
         md5_e = item_box.find_next(attrs={'class': 'hash'})
         info = md5_e.find_next('small').decode_contents().split(' ')
@@ -95,7 +124,7 @@ def parse_ascii2d_result(item_box: Tag) -> Ascii2dResult:
         origin = OriginType.from_str(detail_box.find_next('img').get(key='alt'))
         author_e = link.find_next('a')
 
-        thumbnail_link = f"https://ascii2d.net{item_box.find_next(attrs={'class': 'image-box'}).find_next('img').get(key='src')}"
+        thumbnail_link = f"{base_url}{item_box.find_next(attrs={'class': 'image-box'}).find_next('img').get(key='src')}"
         md5_hash = md5_e.decode_contents()
         width = int(size.split('x')[0])
         height = int(size.split('x')[1])
@@ -148,33 +177,6 @@ class Ascii2dParseError(BaseException):
     pass
 
 
-class PISAscii2dExtend(PISAscii2d):
-    def __init__(self, **request_kwargs: Any):
-        super().__init__(**request_kwargs)
-
-    async def search_md5_raw(self, hash: str) -> tuple[str, str]:
-        resp_text, resp_url, _ = await self.get(f'https://ascii2d.net/search/color/{hash}')
-        return resp_text, resp_url
-
-    async def search_raw(
-        self, url: str | None = None, file: str | bytes | Path | None = None
-    ) -> tuple[str, str]:
-        if url:
-            ascii2d_url = 'https://ascii2d.net/search/uri'
-            resp_text, resp_url, _ = await self.post(ascii2d_url, data={"uri": url})
-        elif file:
-            ascii2d_url = 'https://ascii2d.net/search/file'
-            files: dict[str, Any] = {"file": file if isinstance(file, bytes) else open(file, "rb")}
-            resp_text, resp_url, _ = await self.post(ascii2d_url, files=files)
-        else:
-            raise ValueError("url or file is required")
-
-        if self.bovw:
-            resp_text, resp_url, _ = await self.get(resp_url.replace('/color/', '/bovw/'))
-
-        return resp_text, resp_url
-
-
 class SortOrder(Enum):
     No = 'no'
     ImageSize = 'imagesize'
@@ -195,11 +197,21 @@ class Ascii2dConfig:
         sort_order: SortOrder = SortOrder.No,
         first: int = 0,
         prefered: OriginType = OriginType.Pixiv,
+        base_url: str = 'https://ascii2d.net',
+        upload_mode: UploadMode = UploadMode.Original,
+        upload_max_size: int = 1000,
+        upload_quality: int = 90,
+        aspect_tolerance: float = 0.1,
     ) -> None:
         self.user_agent = user_agent
         self.sort_order = sort_order
         self.first = first
         self.prefered = prefered
+        self.base_url = base_url.rstrip('/')
+        self.upload_mode = upload_mode
+        self.upload_max_size = upload_max_size
+        self.upload_quality = upload_quality
+        self.aspect_tolerance = aspect_tolerance
 
 
 @dataclass
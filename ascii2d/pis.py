@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+from PicImageSearch.ascii2d import Ascii2D as PISAscii2d
+
+
+class PISAscii2dExtend(PISAscii2d):
+    def __init__(self, base_url: str = 'https://ascii2d.net', **request_kwargs: Any):
+        super().__init__(**request_kwargs)
+        self.base_url = base_url.rstrip('/')
+
+    async def search_md5_raw(self, hash: str) -> tuple[str, str]:
+        resp_text, resp_url, _ = await self.get(f'{self.base_url}/search/color/{hash}')
+        return resp_text, resp_url
+
+    async def search_raw(
+        self, url: str | None = None, file: str | bytes | Path | None = None
+    ) -> tuple[str, str]:
+        if url:
+            ascii2d_url = f'{self.base_url}/search/uri'
+            resp_text, resp_url, _ = await self.post(ascii2d_url, data={"uri": url})
+        elif file:
+            ascii2d_url = f'{self.base_url}/search/file'
+            files: dict[str, Any] = {"file": file if isinstance(file, bytes) else open(file, "rb")}
+            resp_text, resp_url, _ = await self.post(ascii2d_url, files=files)
+        else:
+            raise ValueError("url or file is required")
+
+        if self.bovw:
+            resp_text, resp_url, _ = await self.get(resp_url.replace('/color/', '/bovw/'))
+
+        return resp_text, resp_url
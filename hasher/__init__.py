@@ -1 +1,2 @@
-from .hasher import Hasher, HashAlg
\ No newline at end of file
+from .hasher import Hasher, HashAlg
+from .multihash import PackedMultiHash, multihash_diff
\ No newline at end of file
@@ -1,42 +1,74 @@
 from __future__ import annotations
 
 from enum import Enum
+from functools import partial
+from typing import TYPE_CHECKING
 
-from imagehash import (
-    ImageHash,
-    ImageMultiHash,
-    average_hash,
-    colorhash,
-    crop_resistant_hash,
-    dhash,
-    phash,
-    phash_simple,
-    whash,
-)
-from PIL import Image
+if TYPE_CHECKING:
+    from imagehash import ImageHash, ImageMultiHash
+    from PIL import Image
 
 
 class Hasher:
     def __init__(self, hash_alg: HashAlg, hash_size: int = 16) -> None:
-        match hash_alg:
-            case HashAlg.Average:
-                self.__hasher__ = average_hash
-            case HashAlg.Perceptual:
-                self.__hasher__ = phash
-            case HashAlg.PerceptualSimple:
-                self.__hasher__ = phash_simple
-            case HashAlg.Difference:
-                self.__hasher__ = dhash
-            case HashAlg.Wavelet:
-                self.__hasher__ = whash
-            case HashAlg.HSV:
-                self.__hasher__ = colorhash
-            case HashAlg.CropResistant:
-                self.__hasher__ = crop_resistant_hash
+        self.__hasher__ = None
+        self.hash_alg = hash_alg
         self.hash_size = hash_size
 
+    @property
+    def tag(self) -> str:
+        return f'{self.hash_alg.value}-{self.hash_size}'
+
     def hash(self, img: Image.Image) -> ImageHash | ImageMultiHash:
-        return self.__hasher__(img, self.hash_size)
+        if self.__hasher__ is None:
+            self.__hasher__ = get_hash_func(self.hash_alg, self.hash_size)
+        return self.__hasher__(img)
+
+    def dumps(self, img_hash: ImageHash | ImageMultiHash) -> str:
+        import numpy
+        from imagehash import ImageMultiHash
+
+        if isinstance(img_hash, ImageMultiHash):
+            return ','.join(self.dumps(h) for h in img_hash.segment_hashes)
+        rows, cols = img_hash.hash.shape
+        return f'{rows}x{cols}:{numpy.packbits(img_hash.hash.flatten()).tobytes().hex()}'
+
+    def loads(self, s: str) -> ImageHash | ImageMultiHash:
+        from imagehash import ImageMultiHash
+
+        if self.hash_alg == HashAlg.CropResistant:
+            return ImageMultiHash([load_hash(h) for h in s.split(',')])
+        return load_hash(s)
+
+
+def get_hash_func(hash_alg: HashAlg, hash_size: int):
+    import imagehash
+
+    match hash_alg:
+        case HashAlg.Average:
+            return partial(imagehash.average_hash, hash_size=hash_size)
+        case HashAlg.Perceptual:
+            return partial(imagehash.phash, hash_size=hash_size)
+        case HashAlg.PerceptualSimple:
+            return partial(imagehash.phash_simple, hash_size=hash_size)
+        case HashAlg.Difference:
+            return partial(imagehash.dhash, hash_size=hash_size)
+        case HashAlg.Wavelet:
+            return partial(imagehash.whash, hash_size=hash_size)
+        case HashAlg.HSV:
+            return partial(imagehash.colorhash, binbits=hash_size)
+        case HashAlg.CropResistant:
+            return partial(imagehash.crop_resistant_hash, hash_func=partial(imagehash.dhash, hash_size=hash_size))
+
+
+def load_hash(s: str) -> ImageHash:
+    import numpy
+    from imagehash import ImageHash
+
+    shape, hex_str = s.split(':')
+    rows, cols = (int(n) for n in shape.split('x'))
+    bits = numpy.unpackbits(numpy.frombuffer(bytes.fromhex(hex_str), dtype=numpy.uint8))[: rows * cols]
+    return ImageHash(bits.astype(bool).reshape(rows, cols))
 
 
 class HashAlg(Enum):
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from functools import cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy
+    from imagehash import ImageMultiHash
+
+CHUNK_BYTES = 1 << 20
+
+
+class PackedMultiHash:
+    def __init__(self, segments: numpy.ndarray, bits: int) -> None:
+        self.segments = segments
+        self.bits = bits
+
+    @classmethod
+    def from_multihash(cls, img_hash: ImageMultiHash) -> PackedMultiHash:
+        import numpy
+
+        if len(img_hash.segment_hashes) == 0:
+            return cls(numpy.zeros((0, 0), dtype=numpy.uint8), 0)
+        bits = img_hash.segment_hashes[0].hash.size
+        segments = numpy.packbits(numpy.stack([h.hash.reshape(-1) for h in img_hash.segment_hashes]), axis=1)
+        return cls(segments, bits)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def diff(self, other: PackedMultiHash, hamming_cutoff: float = None, limit: int = None) -> tuple[int, int]:
+        import numpy
+
+        if len(self) == 0 or len(other) == 0:
+            return 0, 0
+        if self.segments.shape[1] != other.segments.shape[1]:
+            raise TypeError
+        if hamming_cutoff is None:
+            hamming_cutoff = self.bits * 0.25
+        table = popcount_table()
+        rows = max(1, CHUNK_BYTES // other.segments.size)
+        count = 0
+        total = 0
+        for start in range(0, len(self), rows):
+            xor = self.segments[start : start + rows, None, :] ^ other.segments[None, :, :]
+            lowest = table[xor].sum(axis=2, dtype=numpy.uint32).min(axis=1)
+            matched = lowest[lowest <= hamming_cutoff]
+            count += len(matched)
+            total += int(matched.sum())
+            if limit is not None and total > limit:
+                break
+        return count, total
+
+
+@cache
+def popcount_table() -> numpy.ndarray:
+    import numpy
+
+    return numpy.unpackbits(numpy.arange(256, dtype=numpy.uint8)[:, None], axis=1).sum(axis=1, dtype=numpy.uint8)
+
+
+def multihash_diff(hash_1: ImageMultiHash, hash_2: ImageMultiHash, limit: int = None) -> tuple[int, int]:
+    return PackedMultiHash.from_multihash(hash_1).diff(PackedMultiHash.from_multihash(hash_2), limit=limit)
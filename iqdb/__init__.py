@@ -0,0 +1 @@
+from .iqdb import Iqdb, IqdbConfig
\ No newline at end of file
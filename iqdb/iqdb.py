@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import quote, urlparse
+
+import asyncio_atexit
+from aiohttp import ClientError, ClientSession, FormData
+
+from ascii2d import Ascii2dResult
+from origins import OriginType
+from origins.danbooru import get_json_url
+from searcher import Searcher, UploadMode, rank_by_geometry, read_upload
+from utils import MemoryBudget, file_image_cost
+
+if TYPE_CHECKING:
+    from bs4 import Tag
+
+SIZE_PATTERN = re.compile(r'(\d+)\s*[×x]\s*(\d+)')
+SIMILARITY_PATTERN = re.compile(r'(\d+(?:\.\d+)?)%\s*similarity')
+ORIGIN_HOSTS = {
+    'danbooru.donmai.us': OriginType.Danbooru,
+    'www.pixiv.net': OriginType.Pixiv,
+    'pixiv.net': OriginType.Pixiv,
+    'twitter.com': OriginType.Twitter,
+    'x.com': OriginType.Twitter,
+}
+
+
+class Iqdb(Searcher):
+    def __init__(self, config: IqdbConfig, budget: MemoryBudget = None) -> None:
+        self.config = config
+        self.budget = budget if budget is not None else MemoryBudget()
+        self.session = None
+        self.hosts = {**ORIGIN_HOSTS, urlparse(config.danbooru_url).netloc: OriginType.Danbooru}
+
+    async def __get_session(self) -> ClientSession:
+        if self.session is None:
+            self.session = ClientSession()
+            if self.config.user_agent is not None:
+                self.session.headers.update({'user-agent': self.config.user_agent})
+            asyncio_atexit.register(self.__cleanup)
+        return self.session
+
+    async def search(self, img_path: str | Path, md5: str = None) -> list[Ascii2dResult]:
+        session = await self.__get_session()
+        match self.config.upload_mode:
+            case UploadMode.Original:
+                cost = Path(img_path).stat().st_size
+            case UploadMode.Downscale:
+                cost = await asyncio.to_thread(file_image_cost, img_path)
+        async with self.budget.reserve(cost):
+            file = await asyncio.to_thread(read_upload, img_path, self.config.upload_mode, self.config.upload_max_size, self.config.upload_quality)
+            form = FormData()
+            form.add_field('file', file, filename=Path(img_path).name)
+            async with session.post(f'{self.config.base_url}/', data=form) as res:
+                resp_text = await res.text()
+        results = self.__parse_iqdb_resp(resp_text)
+        await asyncio.gather(*(self.__fill_danbooru(r) for r in results if r.origin == OriginType.Danbooru))
+        return results
+
+    async def __fill_danbooru(self, result: Ascii2dResult):
+        session = await self.__get_session()
+        try:
+            async with session.get(get_json_url(result.orig_link, self.config.danbooru_url)) as res:
+                if res.status != 200:
+                    return
+                post = await res.json()
+        except (ClientError, ValueError):
+            return
+        apply_danbooru_post(result, post)
+
+    def __parse_iqdb_resp(self, resp_text: str) -> list[Ascii2dResult]:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(resp_text, 'lxml')
+        results = list[Ascii2dResult]()
+        for table in soup.select('#pages > div > table'):
+            try:
+                parsed = parse_iqdb_result(table, self.config.base_url, self.hosts)
+            except IqdbParseError:
+                continue
+            if parsed.similarity < self.config.min_similarity:
+                continue
+            results.extend(parsed.results)
+        return results
+
+    def rank_results(self, results: list[Ascii2dResult], width: int, height: int) -> list[Ascii2dResult]:
+        return rank_by_geometry(results, width, height, self.config.prefered, self.config.aspect_tolerance)
+
+    async def fetch_thumbnail(self, target: Ascii2dResult) -> BytesIO:
+        session = await self.__get_session()
+        async with session.get(target.thumbnail_link) as res:
+            buf = await res.content.read()
+            return BytesIO(buf)
+
+    async def __cleanup(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class IqdbMatch:
+    def __init__(self, similarity: float, results: list[Ascii2dResult]) -> None:
+        self.similarity = similarity
+        self.results = results
+
+
+def parse_iqdb_result(table: Tag, base_url: str = 'https://iqdb.org', hosts: dict[str, OriginType] = None) -> IqdbMatch:
+    hosts = hosts if hosts is not None else ORIGIN_HOSTS
+    header = table.find('th')
+    if header is not None and header.get_text(strip=True) in ('Your image', 'No relevant matches'):
+        raise IqdbParseError
+    image = table.select_one('td.image img') or table.select_one('td > a > img')
+    text = table.get_text(' ', strip=True)
+    size = SIZE_PATTERN.search(text)
+    similarity = SIMILARITY_PATTERN.search(text)
+    if image is None or size is None or similarity is None:
+        raise IqdbParseError
+
+    src = image.get('src', '')
+    thumbnail_link = f'https:{src}' if src.startswith('//') else src if src.startswith('http') else f'{base_url}{src}'
+    width = int(size.group(1))
+    height = int(size.group(2))
+
+    results = list[Ascii2dResult]()
+    for link in table.find_all('a', href=True):
+        orig_link = normalize_link(link['href'])
+        origin = hosts.get(urlparse(orig_link).netloc)
+        if origin is None:
+            continue
+        id = urlparse(orig_link).path.rstrip('/').split('/')[-1]
+        results.append(
+            Ascii2dResult(
+                thumbnail_link,
+                '',
+                width,
+                height,
+                '',
+                0.0,
+                width * height,
+                origin,
+                orig_link,
+                '',
+                '',
+                '',
+                '',
+                None,
+                id,
+            )
+        )
+    return IqdbMatch(float(similarity.group(1)), results)
+
+
+def apply_danbooru_post(result: Ascii2dResult, post: dict):
+    parsed = urlparse(result.orig_link)
+    artist = post.get('tag_string_artist', '').split(' ')[0]
+    result.author = artist
+    result.author_id = artist
+    result.author_link = f'{parsed.scheme}://{parsed.netloc}/posts?tags={quote(artist)}' if artist else ''
+    result.title = post.get('tag_string_copyright', '').split(' ')[0]
+    result.md5 = post.get('md5', '')
+    result.extension = post.get('file_ext', '')
+    result.file_size = post.get('file_size', 0) / 1024
+    result.width = post.get('image_width', result.width)
+    result.height = post.get('image_height', result.height)
+    result.image_size = result.width * result.height
+
+
+def normalize_link(link: str) -> str:
+    if link.startswith('//'):
+        return f'https:{link}'
+    return link
+
+
+class IqdbParseError(BaseException):
+    pass
+
+
+class IqdbConfig:
+    def __init__(
+        self,
+        user_agent: str = None,
+        prefered: OriginType = OriginType.Danbooru,
+        base_url: str = 'https://iqdb.org',
+        min_similarity: float = 80.0,
+        upload_mode: UploadMode = UploadMode.Downscale,
+        upload_max_size: int = 1000,
+        upload_quality: int = 90,
+        aspect_tolerance: float = 0.1,
+        danbooru_url: str = 'https://danbooru.donmai.us',
+    ) -> None:
+        self.user_agent = user_agent
+        self.prefered = prefered
+        self.base_url = base_url.rstrip('/')
+        self.min_similarity = min_similarity
+        self.upload_mode = upload_mode
+        self.upload_max_size = upload_max_size
+        self.upload_quality = upload_quality
+        self.aspect_tolerance = aspect_tolerance
+        self.danbooru_url = danbooru_url.rstrip('/')
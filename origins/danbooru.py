@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from io import BytesIO
+from urllib.parse import urlparse, urlunparse
+
+import asyncio_atexit
+from aiohttp import ClientSession
+
+from origins import DeletedException, Origin, OriginData
+
+
+class Danbooru(Origin):
+    def __init__(self, config: DanbooruConfig) -> None:
+        self.config = config
+        self.session = None
+
+    async def __get_session(self) -> ClientSession:
+        if self.session is None:
+            self.session = ClientSession()
+            if self.config.user_agent is not None:
+                self.session.headers.update({'user-agent': self.config.user_agent})
+            asyncio_atexit.register(self.__cleanup)
+        return self.session
+
+    async def fetch_data(self, url: str) -> OriginData:
+        session = await self.__get_session()
+        async with session.get(get_json_url(url, self.config.base_url)) as r:
+            if r.status == 404:
+                raise DanbooruDeletedException
+            post = await r.json()
+            file_url = post.get('file_url')
+            if not file_url or post.get('is_deleted'):
+                raise DanbooruDeletedException
+            thumb_url = post.get('preview_file_url') or post.get('large_file_url') or file_url
+            return OriginData([file_url], [thumb_url], 1)
+
+    async def fetch_img(self, url: str) -> BytesIO:
+        session = await self.__get_session()
+        async with session.get(url) as res:
+            buf = await res.content.read()
+            return BytesIO(buf)
+
+    async def __cleanup(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+def get_json_url(url: str, base_url: str = None) -> str:
+    parsed = urlparse(url)
+    path = parsed.path.rstrip('/')
+    if not path.endswith('.json'):
+        path = f'{path}.json'
+    if base_url is not None:
+        base = urlparse(base_url)
+        return urlunparse((base.scheme, base.netloc, path, '', '', ''))
+    return urlunparse((parsed.scheme or 'https', parsed.netloc, path, '', '', ''))
+
+
+class DanbooruDeletedException(DeletedException):
+    pass
+
+
+class DanbooruConfig:
+    def __init__(self, user_agent: str = None, base_url: str = 'https://danbooru.donmai.us') -> None:
+        self.user_agent = user_agent
+        self.base_url = base_url.rstrip('/')
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import asyncio
+from io import BytesIO
+from time import time
+
+from origins import Origin, OriginData
+from saberdb import SaberDB
+
+
+class MemoOrigin(Origin):
+    def __init__(self, origin: Origin, db: SaberDB, ttl: float = 7.0) -> None:
+        self.origin = origin
+        self.db = db
+        self.ttl = ttl * 86400
+        self.__memo = dict[str, tuple[OriginData, float]]()
+        self.__inflight = dict[str, asyncio.Task[OriginData]]()
+
+    async def fetch_data(self, url: str) -> OriginData:
+        cached = self.__get_cached(url)
+        if cached is not None:
+            return cached
+        task = self.__inflight.get(url)
+        if task is None:
+            task = asyncio.create_task(self.__fetch(url))
+            self.__inflight[url] = task
+            task.add_done_callback(lambda t: self.__done(url, t))
+        return await asyncio.shield(task)
+
+    async def __fetch(self, url: str) -> OriginData:
+        data = await self.origin.fetch_data(url)
+        if self.ttl > 0:
+            fetched = time()
+            self.__memo[url] = (data, fetched)
+            self.db.put_origin_data(url, data, fetched)
+        return data
+
+    def __done(self, url: str, task: asyncio.Task[OriginData]):
+        if self.__inflight.get(url) is task:
+            del self.__inflight[url]
+        if not task.cancelled():
+            task.exception()
+
+    async def fetch_img(self, url: str) -> BytesIO:
+        return await self.origin.fetch_img(url)
+
+    def __get_cached(self, url: str) -> OriginData | None:
+        if self.ttl <= 0:
+            return None
+        since = time() - self.ttl
+        cached = self.__memo.get(url)
+        if cached is not None:
+            if cached[1] > since:
+                return cached[0]
+            del self.__memo[url]
+        stored = self.db.get_origin_data(url, since)
+        if stored is not None:
+            self.__memo[url] = stored
+            return stored[0]
+        return None
@@ -31,6 +31,7 @@ class OriginType(Enum):
     Pixiv = 'pixiv'
     Niconico = 'niconico'
     Fanbox = 'fanbox'
+    Danbooru = 'danbooru'
 
     @classmethod
     def from_str(cls, s: str):
@@ -7,7 +7,6 @@ from urllib.parse import urlparse, urlunparse
 
 import asyncio_atexit
 from aiohttp import ClientSession
-from bs4 import BeautifulSoup
 
 from origins import DeletedException, Origin, OriginData
 
@@ -23,10 +22,12 @@ class Pixiv(Origin):
             self.session = ClientSession(cookies=cookies)
             if self.config.user_agent is not None:
                 self.session.headers.update({'user-agent': self.config.user_agent})
-        asyncio_atexit.register(self.__cleanup)
+            asyncio_atexit.register(self.__cleanup)
         return self.session
 
     async def fetch_data(self, url: str) -> OriginData:
+        from bs4 import BeautifulSoup
+
         session = await self.__get_session()
         img_id = urlparse(url).path.split('/')[-1]
         async with session.get(url) as r:
@@ -2,22 +2,17 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from io import BytesIO
+from typing import TYPE_CHECKING
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
 import asyncio_atexit
 from aiohttp import ClientSession
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver import Chrome, ChromeOptions
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.webdriver import WebDriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
-from webdriver_manager.chrome import ChromeDriverManager
 
 from origins import DeletedException, Origin, OriginData
 
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver
+
 NAMES = ['thumb', 'small', 'medium', 'large', 'orig']
 BLOCK_XPATH = '/html/body/div[1]/div/div/div[2]/main/div/div/div/div/div/section/div/div/div[1]/div/div/article/div/div/div[3]/div[3]/div/div/div/div/div[2]/div/div[2]'
 POST_XPATH = '/html/body/div[1]/div/div/div[2]/main/div/div/div/div/div/section/div/div/div[1]/div/div/article'
@@ -30,12 +25,16 @@ class Twitter(Origin):
     def __init__(self, config: TwitterConfig) -> None:
         self.config = config
         self.__session = None
-        self.__driver_manager = ChromeDriverManager()
         self.__driver = None
 
     def __get_driver(self) -> WebDriver:
         if self.__driver is None:
-            driver_path = self.__driver_manager.install()
+            from selenium.webdriver import Chrome, ChromeOptions
+            from selenium.webdriver.chrome.service import Service
+            from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+            from webdriver_manager.chrome import ChromeDriverManager
+
+            driver_path = ChromeDriverManager().install()
             options = ChromeOptions()
             options.add_argument('--disable-gpu')
             options.add_argument('--blink-settings=imagesEnabled=false')
@@ -66,10 +65,15 @@ class Twitter(Origin):
             self.__session = ClientSession()
             if self.config.user_agent is not None:
                 self.__session.headers.update({'user-agent': self.config.user_agent})
-        asyncio_atexit.register(self.__cleanup)
+            asyncio_atexit.register(self.__cleanup)
         return self.__session
 
     async def fetch_data(self, target: str) -> OriginData:
+        from selenium.common.exceptions import NoSuchElementException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.wait import WebDriverWait
+
         driver = self.__get_driver()
         driver.get(target)
         WebDriverWait(driver, 30).until(
@@ -1 +1,3 @@
-from .saber import Saber, SaberConfig
\ No newline at end of file
+from .plan import DownloadConfig, PlanEntry
+from .saber import JobConfig, Saber, SaberConfig
+from .watcher import Watcher, WatcherConfig
\ No newline at end of file
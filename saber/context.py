@@ -1,16 +1,22 @@
-from pathlib import Path
+from __future__ import annotations
 
-from imagehash import ImageHash, ImageMultiHash
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 from ascii2d import Ascii2dResult
 
+if TYPE_CHECKING:
+    from imagehash import ImageHash, ImageMultiHash
+
 
 class SaberContext:
-    def __init__(self, src_path: str | Path, hash: ImageHash | ImageMultiHash, md5: str) -> None:
-        self.src_path: Path = src_path if isinstance(src_path) else Path(src_path)
+    def __init__(self, src_path: str | Path, hash: ImageHash | ImageMultiHash, md5: str, width: int = 0, height: int = 0) -> None:
+        self.src_path: Path = src_path if isinstance(src_path, Path) else Path(src_path)
         self.hash: ImageHash | ImageMultiHash = hash
         self.target: Ascii2dResult = None
         self.results: list[Ascii2dResult] = None
         self.dest_url: str = None
         self.dest_path: Path = None
         self.md5: str = md5
+        self.width: int = width
+        self.height: int = height
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from json import dumps, loads
+
+from ascii2d import Ascii2dResult, OriginType
+
+
+@dataclass
+class PlanEntry:
+    src: str
+    md5: str
+    hash: str
+    target: Ascii2dResult
+    dest_url: str
+    filename: str
+
+    def dumps(self) -> str:
+        d = asdict(self)
+        d['target']['origin'] = self.target.origin.value
+        return dumps(d, ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, line: str) -> PlanEntry:
+        d = loads(line)
+        d['target']['origin'] = OriginType.from_str(d['target']['origin'])
+        d['target'] = Ascii2dResult(**d['target'])
+        return cls(**d)
+
+
+class DownloadConfig:
+    def __init__(self, workers: int = 8, per_host: int = 2) -> None:
+        self.workers = max(workers, 1)
+        self.per_host = max(per_host, 1)
@@ -1,121 +1,349 @@
 from __future__ import annotations
 
-from hashlib import md5
+import asyncio
+import concurrent.futures
+import os
+import signal
+import socket
+import threading
+from collections.abc import AsyncIterable, Awaitable, Callable, Iterable
+from copy import copy
 from io import BytesIO
 from multiprocessing import cpu_count
 from pathlib import Path
+from typing import TYPE_CHECKING, TypeVar
+from urllib.parse import parse_qs, urlparse
+from uuid import uuid4
 
 import aiofiles
-from imagehash import ImageHash, ImageMultiHash
 from PIL import Image, UnidentifiedImageError
 
-from ascii2d import Ascii2d, Ascii2dResult, OriginType
+from ascii2d import Ascii2dResult, OriginType
 from hasher import Hasher
 from origins import DeletedException, Origin, OriginData
-from origins.pixiv import Pixiv
-from origins.twitter import Twitter
 from saber.context import SaberContext
+from saber.plan import DownloadConfig, PlanEntry
+from saber.watcher import Watcher
 from saberdb import SaberDB
-from saberdb.model import SaberRecord
-from utils import async_copyfile, async_write_file, is_identical
+from saberdb.model import JobState, MissReason, SaberRecord
+from searcher import Searcher
+from thumbcache import ThumbCache, ThumbCacheConfig
+from utils import MemoryBudget, async_copyfile, async_write_file, file_md5, image_cost, is_identical, scan_files
+
+if TYPE_CHECKING:
+    from imagehash import ImageHash, ImageMultiHash
+
+T = TypeVar('T')
 
 
 class Saber:
     def __init__(
         self,
         config: SaberConfig,
-        ascii2d: Ascii2d,
+        searchers: Searcher | list[Searcher],
         hasher: Hasher,
         db: SaberDB,
-        pixiv: Pixiv,
-        twitter: Twitter,
+        pixiv: Origin,
+        twitter: Origin,
+        budget: MemoryBudget = None,
+        cache: ThumbCache = None,
+        danbooru: Origin = None,
     ) -> None:
         self.config = config
-        self.ascii2d = ascii2d
+        self.searchers = searchers if isinstance(searchers, list) else [searchers]
         self.hasher = hasher
         self.db = db
         self.pixiv = pixiv
         self.twitter = twitter
+        self.danbooru = danbooru
+        self.budget = budget if budget is not None else MemoryBudget()
+        self.cache = cache if cache is not None else ThumbCache(ThumbCacheConfig())
+        self.dropped_candidates = 0
 
     async def sort(self):
-        queue = self.config.src_dir.glob('*')
+        await self.__run((Path(entry.path) for entry in self.__scan()), self.__sort_process)
+        self.__report()
 
-        for item in queue:
-            if item.is_file():
-                await self.__sort_process(item)
+    async def plan(self, plan_path: str | Path):
+        async with aiofiles.open(plan_path, 'a', encoding='utf-8') as plan_file:
 
-    async def __sort_process(self, src_path: Path):
-        async with aiofiles.open(src_path, 'rb') as f:
-            buf = await f.read()
-            md5_hash = md5()
-            md5_hash.update(buf)
+            async def plan_process(src_path: Path):
+                ctx = await self.__search_process(src_path)
+                if ctx is None:
+                    return
+                entry = PlanEntry(
+                    str(ctx.src_path),
+                    ctx.md5,
+                    str(ctx.hash),
+                    ctx.target,
+                    ctx.dest_url,
+                    format_filename(self.config.filename_fmt, ctx.target),
+                )
+                await plan_file.write(f'{entry.dumps()}\n')
+                await plan_file.flush()
+
+            await self.__run((Path(entry.path) for entry in self.__scan()), plan_process)
+        self.__report()
+
+    async def download(self, plan_path: str | Path, config: DownloadConfig):
+        hosts = dict[str, asyncio.Semaphore]()
+
+        async def download_process(entry: PlanEntry):
+            ctx = SaberContext(entry.src, entry.hash, entry.md5)
+            ctx.target = entry.target
+            ctx.dest_url = entry.dest_url
+            host = urlparse(entry.dest_url).netloc
+            if host not in hosts:
+                hosts[host] = asyncio.Semaphore(config.per_host)
+            async with hosts[host]:
+                await self.__finally_handler(ctx, entry.filename)
+
+        await self.__run(read_plan(plan_path), download_process, config.workers)
+
+    async def watch(self, watcher: Watcher):
+        stop = self.__stop_event()
+        paths = watcher.watch(self.config.src_dir, self.config.patterns, self.config.recursive, self.__excluded(), stop)
+        await self.__run(paths, self.__sort_process)
+        self.__report()
+
+    def enqueue(self) -> int:
+        return self.db.enqueue(str(Path(entry.path).absolute()) for entry in self.__scan())
+
+    async def work(self, config: JobConfig):
+        stop = self.__stop_event()
+        workers = [self.__job_worker(config, f'{config.worker_id}-{i}', stop) for i in range(self.config.workers)]
+        await asyncio.gather(*workers)
+        self.__report()
+
+    async def __job_worker(self, config: JobConfig, owner: str, stop: asyncio.Event):
+        while not stop.is_set():
+            path = self.db.claim(owner, config.lease, config.max_attempts)
+            if path is None:
+                if config.exit_when_idle and not self.db.has_open_jobs():
+                    break
+                try:
+                    await asyncio.wait_for(stop.wait(), config.poll)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heartbeat = asyncio.create_task(self.__heartbeat(config, owner, path))
+            state = JobState.Done
             try:
-                img = Image.open(BytesIO(buf))
-                src_hash = self.hasher.hash(img)
-            except UnidentifiedImageError:
+                await self.__sort_process(Path(path))
+            except Exception as e:
+                print(f'{path}: {e!r}')
+                state = JobState.Failed
+            finally:
+                heartbeat.cancel()
+            self.db.finish(path, owner, state, config.max_attempts)
+
+    async def __heartbeat(self, config: JobConfig, owner: str, path: str):
+        while True:
+            await asyncio.sleep(config.lease / 3)
+            if not self.db.heartbeat(path, owner, config.lease):
+                print(f'{path}: lease lost')
                 return
 
-        ctx = SaberContext(src_path, src_hash, md5_hash.hexdigest())
+    def __report(self):
+        print(f'{self.dropped_candidates} candidates dropped by aspect ratio')
+
+    def __stop_event(self) -> asyncio.Event:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        return stop
+
+    async def __run(self, items: Iterable[T] | AsyncIterable[T], process: Callable[[T], Awaitable[None]], workers: int = None):
+        queue = asyncio.Queue[T](self.config.lookahead)
+        closing = asyncio.Event()
+        workers = [asyncio.create_task(self.__sort_worker(queue, process, closing)) for _ in range(workers or self.config.workers)]
+        try:
+            if isinstance(items, AsyncIterable):
+                async for item in items:
+                    await queue.put(item)
+            else:
+                await self.__feed(items, queue)
+            await queue.join()
+        finally:
+            closing.set()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def __feed(self, items: Iterable[T], queue: asyncio.Queue[T]):
+        # walking a folder or reading a plan blocks, so it runs in a thread
+        # that waits on each put to keep the queue bounded
+        loop = asyncio.get_running_loop()
+        done = threading.Event()
+
+        def feed():
+            for item in items:
+                future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+                while True:
+                    if done.is_set():
+                        future.cancel()
+                        return
+                    try:
+                        future.result(0.1)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        continue
+
+        try:
+            await asyncio.to_thread(feed)
+        finally:
+            done.set()
+
+    def __scan(self):
+        return scan_files(self.config.src_dir, self.config.patterns, self.config.recursive, self.__excluded())
+
+    def __excluded(self) -> list[Path]:
+        excluded = [self.config.dist_dir, self.config.not_found_dir, self.config.except_dir]
+        if self.cache.config.cache_dir is not None:
+            excluded.append(self.cache.config.cache_dir)
+        return excluded
+
+    async def __sort_worker(self, queue: asyncio.Queue[T], process: Callable[[T], Awaitable[None]], closing: asyncio.Event):
+        while True:
+            item = await queue.get()
+            try:
+                await process(item)
+            except (KeyboardInterrupt, SystemExit):
+                raise
+            except asyncio.CancelledError as e:
+                if closing.is_set():
+                    raise
+                print(f'{item}: {e!r}')
+            except BaseException as e:
+                print(f'{item}: {e!r}')
+            finally:
+                queue.task_done()
+
+    async def __sort_process(self, src_path: Path):
+        ctx = await self.__search_process(src_path)
+        if ctx is not None:
+            await self.__finally_handler(ctx)
+
+    async def __search_process(self, src_path: Path) -> SaberContext | None:
+        md5_hash = await asyncio.to_thread(file_md5, src_path)
+        record = self.db.get_by_md5(md5_hash)
+        if record is not None and os.path.isfile(record.path):
+            return None
+        if self.db.is_missed(None, md5_hash):
+            return None
+        try:
+            img = await asyncio.to_thread(Image.open, src_path)
+        except UnidentifiedImageError:
+            return None
+        width, height = img.size
+        try:
+            async with self.budget.reserve(image_cost(img)):
+                src_hash = await asyncio.to_thread(self.hasher.hash, img)
+        finally:
+            img.close()
+
+        ctx = SaberContext(src_path, src_hash, md5_hash, width, height)
 
         in_db, valid = self.db.is_img_in_db_and_valid(ctx.hash)
         if in_db:
             if valid:
-                return
+                return None
             else:
                 self.db.delete(ctx.hash)
 
-        ctx.results = await self.ascii2d.search(ctx.src_path, ctx.md5)
+        if self.db.is_missed(ctx.hash, ctx.md5):
+            return None
+
         try:
-            await self.__match_results(ctx)
-            await self.__match_varaint(ctx)
-            await self.__finally_handler(ctx)
+            return await self.__search(ctx)
         except NoMatchResultException:
             await self.__not_found_handler(ctx)
+            self.db.add_miss(ctx.hash, ctx.md5, MissReason.NotFound)
             print('no result match')
         except NoMatchVariantException:
             await self.__not_found_handler(ctx)
+            self.db.add_miss(ctx.hash, ctx.md5, MissReason.NoVariant)
             print('no varaint match')
         except DeletedException:
             await self.__deleted_handler(ctx)
+            self.db.add_miss(ctx.hash, ctx.md5, MissReason.Deleted)
             print('deleted')
         except NotSupportOriginException:
+            self.db.add_miss(ctx.hash, ctx.md5, MissReason.NotSupport)
             print('not support origin')
+        return None
 
-    async def __match_results(self, ctx: SaberContext):
-        prefered = self.ascii2d.get_prefered_results(ctx.results)
-        index = 0
-        ptr = 0
-        index_out = 0
-        selected = None
-        while True:
+    async def __search(self, ctx: SaberContext) -> SaberContext:
+        attempts = [copy(ctx) for _ in self.searchers]
+        failures = dict[int, BaseException]()
+        if self.config.fanout and len(self.searchers) > 1:
+            tasks = {asyncio.create_task(self.__search_match(a, s)): i for i, (a, s) in enumerate(zip(attempts, self.searchers))}
+            pending = set(tasks)
             try:
-                target = prefered[ptr][index]
-                res = await self.ascii2d.fetch_thumbnail(target)
-                tmp_img = Image.open(res)
-                target_hash = self.hasher.hash(tmp_img)
-                if is_identical(ctx.hash, target_hash, self.config.threshold):
-                    selected = target
-                    break
-                index += ptr
-                ptr = (ptr + 1) % 2
-            except (IndexError, UnidentifiedImageError):
-                if index_out >= 2:
-                    break
-                index_out += 1
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        try:
+                            return task.result()
+                        except asyncio.CancelledError:
+                            failures[tasks[task]] = SearchCancelledException()
+                        except (Exception, NoMatchResultException, NoMatchVariantException, NotSupportOriginException, DeletedException) as e:
+                            failures[tasks[task]] = e
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        else:
+            for i, searcher in enumerate(self.searchers):
+                try:
+                    return await self.__search_match(attempts[i], searcher)
+                except (Exception, NoMatchResultException, NoMatchVariantException, NotSupportOriginException, DeletedException) as e:
+                    failures[i] = e
+        first = min(failures, key=lambda i: (failure_rank(failures[i]), i))
+        ctx.results = attempts[first].results
+        ctx.target = attempts[first].target
+        raise failures[first]
+
+    async def __search_match(self, ctx: SaberContext, searcher: Searcher) -> SaberContext:
+        ctx.results = await searcher.search(ctx.src_path, ctx.md5)
+        await self.__match_results(ctx, searcher)
+        await self.__match_varaint(ctx)
+        if not ctx.target.extension:
+            ctx.target.extension = guess_extension(ctx.dest_url)
+        return ctx
+
+    async def __match_results(self, ctx: SaberContext, searcher: Searcher):
+        ranked = searcher.rank_results(ctx.results, ctx.width, ctx.height)
+        self.dropped_candidates += len(ctx.results) - len(ranked)
+        for target in ranked:
+            try:
+                target_hash = await self.__thumbnail_hash(target.thumbnail_link, lambda: searcher.fetch_thumbnail(target))
+            except UnidentifiedImageError:
                 continue
-        if selected is None:
-            raise NoMatchResultException
-        ctx.target = selected
+            if is_identical(ctx.hash, target_hash, self.config.threshold):
+                ctx.target = target
+                return
+        raise NoMatchResultException
 
-    async def __match_varaint(self, ctx: SaberContext):
+    def __get_origin(self, origin: OriginType) -> Origin:
         origin_handler: Origin = None
-        match ctx.target.origin:
+        match origin:
             case OriginType.Pixiv:
                 origin_handler = self.pixiv
             case OriginType.Twitter:
                 origin_handler = self.twitter
+            case OriginType.Danbooru:
+                origin_handler = self.danbooru
         if origin_handler is None:
             raise NotSupportOriginException
+        return origin_handler
+
+    async def __match_varaint(self, ctx: SaberContext):
+        origin_handler = self.__get_origin(ctx.target.origin)
         origin_data = await origin_handler.fetch_data(ctx.target.orig_link)
         select = await self.__match_origin_variant(origin_handler, ctx.hash, origin_data)
         ctx.dest_url = origin_data.original[select]
@@ -128,37 +356,55 @@ class Saber:
     ) -> int:
         select = None
         for i in range(origin_data.variant):
-            res = await origin_handler.fetch_img(origin_data.thumb[i])
-            with Image.open(res) as tmp_img:
-                tmp_hash = self.hasher.hash(tmp_img)
-                if is_identical(target_hash, tmp_hash, self.config.threshold):
-                    select = i
-                    break
+            thumb = origin_data.thumb[i]
+            tmp_hash = await self.__thumbnail_hash(thumb, lambda: origin_handler.fetch_img(thumb))
+            if is_identical(target_hash, tmp_hash, self.config.threshold):
+                select = i
+                break
         if select is not None:
             return select
         raise NoMatchVariantException
 
+    async def __thumbnail_hash(self, url: str, fetch: Callable[[], Awaitable[BytesIO]]) -> ImageHash | ImageMultiHash:
+        data, hash_str = await self.cache.get(url, self.hasher.tag)
+        if hash_str is not None:
+            return self.hasher.loads(hash_str)
+        if data is None:
+            res = await fetch()
+            data = res.getvalue()
+        with Image.open(BytesIO(data)) as tmp_img:
+            tmp_hash = self.hasher.hash(tmp_img)
+        await self.cache.put(url, data, self.hasher.tag, self.hasher.dumps(tmp_hash))
+        return tmp_hash
+
     async def __deleted_handler(self, ctx: SaberContext):
         file_name = format_filename(self.config.filename_fmt, ctx.target)
         file_path = self.config.except_dir.joinpath(file_name)
         await async_copyfile(ctx.src_path, file_path)
 
-    async def __finally_handler(self, ctx: SaberContext):
-        file_name = format_filename(self.config.filename_fmt, ctx.target)
+    async def __finally_handler(self, ctx: SaberContext, file_name: str = None):
+        if file_name is None:
+            file_name = format_filename(self.config.filename_fmt, ctx.target)
         file_path = self.config.dist_dir.joinpath(file_name)
-        origin_handler = None
-        match ctx.target.origin:
-            case OriginType.Twitter:
-                origin_handler = self.twitter
-            case OriginType.Pixiv:
-                origin_handler = self.pixiv
-        if origin_handler is None:
-            raise NotSupportOriginException
-        async with aiofiles.open(file_path.absolute(), 'wb+') as file:
-            res = await origin_handler.fetch_img(ctx.dest_url)
-            await async_write_file(res, file)
+        origin_handler = self.__get_origin(ctx.target.origin)
+        if self.db.get(ctx.hash) is not None:
+            return
+        part_path = file_path.with_name(f'{file_path.name}.{os.getpid()}-{uuid4().hex}.part')
+        try:
+            async with aiofiles.open(part_path.absolute(), 'wb+') as file:
+                res = await origin_handler.fetch_img(ctx.dest_url)
+                await async_write_file(res, file)
+            if self.db.get(ctx.hash) is not None:
+                return
+            os.replace(part_path, file_path)
+        finally:
+            part_path.unlink(missing_ok=True)
         ctx.dest_path = file_path
-        self.db.add(context_to_record(ctx))
+        self.db.delete_miss(ctx.hash, ctx.md5)
+        if not self.db.add(context_to_record(ctx)):
+            record = self.db.get(ctx.hash)
+            if record is not None and Path(record.path) != file_path:
+                file_path.unlink(missing_ok=True)
 
     async def __not_found_handler(self, ctx: SaberContext):
         dst_path = self.config.not_found_dir.joinpath(ctx.src_path.name)
@@ -175,6 +421,11 @@ class SaberConfig:
         filename_fmt: str,
         threshold: int = 0,
         user_agent: str = None,
+        recursive: bool = True,
+        patterns: list[str] = None,
+        lookahead: int = 64,
+        workers: int = 1,
+        fanout: bool = False,
     ) -> None:
         self.src_dir = src_dir if isinstance(src_dir, Path) else Path(src_dir)
         self.dist_dir = dist_dir if isinstance(dist_dir, Path) else Path(dist_dir)
@@ -184,6 +435,40 @@ class SaberConfig:
         self.threads = cpu_count()
         self.threshold = threshold
         self.user_agent = user_agent
+        self.recursive = recursive
+        self.patterns = patterns if patterns is not None else list[str]()
+        self.lookahead = max(lookahead, 1)
+        self.workers = max(workers, 1)
+        self.fanout = fanout
+
+
+class JobConfig:
+    def __init__(
+        self,
+        worker_id: str = None,
+        lease: float = 120.0,
+        poll: float = 5.0,
+        max_attempts: int = 3,
+        exit_when_idle: bool = False,
+    ) -> None:
+        self.worker_id = worker_id if worker_id else f'{socket.gethostname()}-{os.getpid()}'
+        self.lease = lease
+        self.poll = poll
+        self.max_attempts = max_attempts
+        self.exit_when_idle = exit_when_idle
+
+
+def read_plan(plan_path: str | Path) -> Iterable[PlanEntry]:
+    seen = set[str]()
+    with open(plan_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = PlanEntry.loads(line)
+            if entry.dest_url in seen:
+                continue
+            seen.add(entry.dest_url)
+            yield entry
 
 
 def context_to_record(ctx: SaberContext) -> SaberRecord:
@@ -197,9 +482,26 @@ def context_to_record(ctx: SaberContext) -> SaberRecord:
         ctx.target.orig_link,
         ctx.dest_path,
         ctx.dest_path.stat().st_size,
+        ctx.md5,
     )
 
 
+def guess_extension(url: str) -> str:
+    parsed = urlparse(url)
+    suffix = Path(parsed.path).suffix.lstrip('.').lower()
+    if not suffix:
+        suffix = parse_qs(parsed.query).get('format', ['jpg'])[0].lower()
+    return 'jpg' if suffix == 'jpeg' else suffix
+
+
+def failure_rank(e: BaseException) -> int:
+    if isinstance(e, SearchCancelledException):
+        return 1
+    if isinstance(e, Exception):
+        return 0
+    return 2
+
+
 def format_filename(filename_fmt: str, target: Ascii2dResult) -> str:
     d = {
         'origin': target.origin.value,
@@ -222,3 +524,7 @@ class NoMatchVariantException(BaseException):
 
 class NotSupportOriginException(BaseException):
     pass
+
+
+class SearchCancelledException(Exception):
+    pass
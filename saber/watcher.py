@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from collections.abc import AsyncIterator, Iterable
+from pathlib import Path
+from time import monotonic
+
+from utils import scan_files
+from utils.scanner import is_matched, normalize_pattern
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+
+class Watcher:
+    def __init__(self, config: WatcherConfig) -> None:
+        self.config = config
+        self.__seen = dict[str, tuple[int, int]]()
+        self.__pending = dict[str, tuple[int, int, float]]()
+        self.__wds = dict[int, str]()
+
+    async def watch(
+        self,
+        root: str | Path,
+        patterns: Iterable[str],
+        recursive: bool,
+        exclude: Iterable[str | Path],
+        stop: asyncio.Event,
+    ) -> AsyncIterator[Path]:
+        patterns = list(patterns)
+        exclude = list(exclude)
+        inotify = self.__open_inotify(root, recursive, exclude)
+        self.__rescan(root, patterns, recursive, exclude)
+        last_scan = monotonic()
+        try:
+            while not stop.is_set():
+                if inotify is None:
+                    if monotonic() - last_scan >= self.config.interval:
+                        self.__rescan(root, patterns, recursive, exclude)
+                        last_scan = monotonic()
+                elif not self.__read_inotify(inotify, [normalize_pattern(p) for p in patterns], recursive, exclude):
+                    self.__add_watch(inotify, os.fspath(root), recursive, exclude)
+                    self.__rescan(root, patterns, recursive, exclude)
+                for path in self.__settled():
+                    yield Path(path)
+                try:
+                    await asyncio.wait_for(stop.wait(), self.config.tick)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def __open_inotify(self, root: str | Path, recursive: bool, exclude: list[str | Path]) -> INotify | None:
+        if not self.config.use_inotify or INotify is None:
+            return None
+        try:
+            inotify = INotify()
+        except OSError:
+            return None
+        self.__add_watch(inotify, os.fspath(root), recursive, exclude)
+        return inotify
+
+    def __add_watch(self, inotify: INotify, path: str, recursive: bool, exclude: list[str | Path]):
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.MODIFY
+        try:
+            wd = inotify.add_watch(path, mask)
+        except OSError:
+            return
+        self.__wds[wd] = path
+        if not recursive:
+            return
+        excluded = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+        stack = [path]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False) and os.path.normcase(os.path.abspath(entry.path)) not in excluded:
+                            try:
+                                self.__wds[inotify.add_watch(entry.path, mask)] = entry.path
+                            except OSError:
+                                continue
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def __read_inotify(self, inotify: INotify, patterns: list[str], recursive: bool, exclude: list[str | Path]) -> bool:
+        # False when the kernel queue overflowed and events were lost
+        complete = True
+        for event in inotify.read(timeout=0):
+            if event.mask & flags.Q_OVERFLOW:
+                complete = False
+                continue
+            parent = self.__wds.get(event.wd)
+            if parent is None or not event.name:
+                continue
+            path = os.path.join(parent, event.name)
+            if event.mask & flags.ISDIR:
+                if recursive and event.mask & (flags.CREATE | flags.MOVED_TO):
+                    self.__add_watch(inotify, path, recursive, exclude)
+                    for entry in scan_files(path, patterns, recursive, exclude):
+                        self.__touch(entry.path)
+                continue
+            if is_matched(event.name, patterns):
+                self.__touch(path)
+        return complete
+
+    def __rescan(self, root: str | Path, patterns: list[str], recursive: bool, exclude: list[str | Path]):
+        for entry in scan_files(root, patterns, recursive, exclude):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            self.__touch(entry.path, stat)
+
+    def __touch(self, path: str, stat: os.stat_result = None):
+        try:
+            stat = stat if stat is not None else os.stat(path)
+        except OSError:
+            self.__pending.pop(path, None)
+            return
+        state = (stat.st_size, stat.st_mtime_ns)
+        if self.__seen.get(path) == state:
+            return
+        pending = self.__pending.get(path)
+        if pending is None or pending[:2] != state:
+            self.__pending[path] = (*state, monotonic())
+
+    def __settled(self) -> list[str]:
+        now = monotonic()
+        settled = list[str]()
+        for path, (size, mtime, since) in list(self.__pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.__pending[path]
+                continue
+            state = (stat.st_size, stat.st_mtime_ns)
+            if state != (size, mtime):
+                self.__pending[path] = (*state, now)
+            elif now - since >= self.config.settle and size > 0:
+                del self.__pending[path]
+                self.__seen[path] = state
+                settled.append(path)
+        return settled
+
+
+class WatcherConfig:
+    def __init__(self, interval: float = 5.0, settle: float = 2.0, use_inotify: bool = True, tick: float = 0.5) -> None:
+        self.interval = interval
+        self.settle = settle
+        self.use_inotify = use_inotify
+        self.tick = tick
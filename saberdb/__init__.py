@@ -1 +1 @@
-from .saberdb import SaberDB, SaberDBConfig
\ No newline at end of file
+from .saberdb import SaberDB, SaberDBConfig, SaberDBOutdatedException
\ No newline at end of file
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+from time import perf_counter
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Connection
+
+from saberdb.model import LEGACY_RECORD_TABLE, SCHEMA_VERSION, SaberRecord, encode_hash
+
+LOOKUP_COLUMNS = ('hash', 'origin_link', 'author_id', 'path')
+
+
+class MigrateReport:
+    def __init__(self, rows: int, size_before: int, size_after: int, timings_before: dict[str, float], timings_after: dict[str, float]) -> None:
+        self.rows = rows
+        self.size_before = size_before
+        self.size_after = size_after
+        self.timings_before = timings_before
+        self.timings_after = timings_after
+
+    def __str__(self) -> str:
+        lines = [
+            f'migrated {self.rows} records',
+            f'database size: {self.size_before / 1024:.1f} KB -> {self.size_after / 1024:.1f} KB',
+        ]
+        for column in LOOKUP_COLUMNS:
+            before = self.timings_before.get(column, 0.0) * 1000
+            after = self.timings_after.get(column, 0.0) * 1000
+            lines.append(f'lookup by {column}: {before:.3f} ms -> {after:.3f} ms')
+        return '\n'.join(lines)
+
+
+def migrate(db_path: str, chunk_size: int = 1000, samples: int = 50) -> MigrateReport | None:
+    engine = create_engine(f'sqlite:///{db_path}')
+    if not inspect(engine).has_table(LEGACY_RECORD_TABLE):
+        return None
+    size_before = os.path.getsize(db_path)
+    with engine.connect() as conn:
+        sample = conn.execute(
+            text(f'SELECT hash, origin_link, author_id, path FROM {LEGACY_RECORD_TABLE} ORDER BY RANDOM() LIMIT :n'), {'n': samples}
+        ).all()
+        timings_before = time_lookups(conn, LEGACY_RECORD_TABLE, sample)
+
+    SaberRecord.__table__.create(engine, checkfirst=True)
+    rows = 0
+    last = 0
+    with engine.connect() as conn:
+        while True:
+            chunk = conn.execute(
+                text(
+                    'SELECT rowid, hash, author, author_id, author_link, width, height, origin_link, path, size '
+                    f'FROM {LEGACY_RECORD_TABLE} WHERE rowid > :last ORDER BY rowid LIMIT :n'
+                ),
+                {'last': last, 'n': chunk_size},
+            ).all()
+            if len(chunk) == 0:
+                break
+            last = chunk[-1].rowid
+            values = [
+                {
+                    'hash': encode_hash(r.hash),
+                    'md5': None,
+                    'author': r.author,
+                    'author_id': r.author_id,
+                    'author_link': r.author_link,
+                    'width': r.width,
+                    'height': r.height,
+                    'origin_link': r.origin_link,
+                    'path': r.path,
+                    'size': r.size,
+                }
+                for r in chunk
+            ]
+            conn.execute(insert(SaberRecord).values(values).on_conflict_do_nothing())
+            conn.commit()
+            rows += len(chunk)
+        conn.exec_driver_sql(f'DROP TABLE {LEGACY_RECORD_TABLE}')
+        conn.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('VACUUM')
+    size_after = os.path.getsize(db_path)
+    with engine.connect() as conn:
+        encoded = [(encode_hash(h), *rest) for h, *rest in sample]
+        timings_after = time_lookups(conn, SaberRecord.__tablename__, encoded)
+    engine.dispose()
+    return MigrateReport(rows, size_before, size_after, timings_before, timings_after)
+
+
+def time_lookups(conn: Connection, table: str, sample: list[tuple]) -> dict[str, float]:
+    timings = dict[str, float]()
+    if len(sample) == 0:
+        return timings
+    for i, column in enumerate(LOOKUP_COLUMNS):
+        query = text(f'SELECT * FROM {table} WHERE {column} = :v')
+        start = perf_counter()
+        for row in sample:
+            conn.execute(query, {'v': row[i]}).all()
+        timings[column] = (perf_counter() - start) / len(sample)
+    return timings
@@ -1,25 +1,34 @@
 from __future__ import annotations
 
+from enum import Enum
+from json import dumps
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from imagehash import ImageHash, ImageMultiHash
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Float, Integer, LargeBinary, String
 from sqlalchemy.ext.declarative import declarative_base
 
+if TYPE_CHECKING:
+    from imagehash import ImageHash, ImageMultiHash
+
 Base = declarative_base()
 
+SCHEMA_VERSION = 1
+LEGACY_RECORD_TABLE = 'saberdb'
+
 
 class SaberRecord(Base):
-    __tablename__ = 'saberdb'
+    __tablename__ = 'saberrecord'
 
-    hash = Column(String, primary_key=True)
+    hash = Column(LargeBinary, primary_key=True)
+    md5 = Column(LargeBinary, index=True)
     author = Column(String)
-    author_id = Column(String)
+    author_id = Column(String, index=True)
     author_link = Column(String)
     width = Column(Integer)
     height = Column(Integer)
-    origin_link = Column(String)
-    path = Column(String)
+    origin_link = Column(String, index=True)
+    path = Column(String, index=True)
     size = Column(Integer)
 
     def __init__(
@@ -33,8 +42,10 @@ class SaberRecord(Base):
         origin_link: str,
         path: str | Path,
         size: int,
+        md5: str | bytes = None,
     ) -> None:
-        self.hash = hash if isinstance(hash, str) else str(hash)
+        self.hash = encode_hash(hash)
+        self.md5 = encode_md5(md5)
         self.author = author
         self.author_id = author_id
         self.author_link = author_link
@@ -43,3 +54,78 @@ class SaberRecord(Base):
         self.origin_link = origin_link
         self.path = path if isinstance(path, str) else str(path)
         self.size = size
+
+
+def encode_hash(hash: str | bytes | ImageHash | ImageMultiHash) -> bytes:
+    if isinstance(hash, bytes):
+        return hash
+    return b''.join(bytes.fromhex(h if len(h) % 2 == 0 else f'0{h}') for h in str(hash).split(','))
+
+
+def encode_md5(md5: str | bytes | None) -> bytes | None:
+    if md5 is None or isinstance(md5, bytes):
+        return md5
+    return bytes.fromhex(md5)
+
+
+class SaberJob(Base):
+    __tablename__ = 'saberjob'
+
+    path = Column(String, primary_key=True)
+    state = Column(String, index=True)
+    owner = Column(String)
+    lease = Column(Float)
+    attempts = Column(Integer)
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = path if isinstance(path, str) else str(path)
+        self.state = JobState.Pending.value
+        self.owner = None
+        self.lease = 0.0
+        self.attempts = 0
+
+
+class JobState(Enum):
+    Pending = 'pending'
+    Claimed = 'claimed'
+    Done = 'done'
+    Failed = 'failed'
+
+
+class SaberMiss(Base):
+    __tablename__ = 'sabermiss'
+
+    md5 = Column(String, primary_key=True)
+    hash = Column(String, index=True)
+    reason = Column(String)
+    checked = Column(Float)
+
+    def __init__(self, hash: str | ImageHash | ImageMultiHash, md5: str, reason: MissReason, checked: float) -> None:
+        self.hash = hash if isinstance(hash, str) else str(hash)
+        self.md5 = md5
+        self.reason = reason.value
+        self.checked = checked
+
+
+class MissReason(Enum):
+    NotFound = 'not_found'
+    NoVariant = 'no_variant'
+    Deleted = 'deleted'
+    NotSupport = 'not_support'
+
+
+class SaberOrigin(Base):
+    __tablename__ = 'saberorigin'
+
+    origin_link = Column(String, primary_key=True)
+    original = Column(String)
+    thumb = Column(String)
+    variant = Column(Integer)
+    fetched = Column(Float)
+
+    def __init__(self, origin_link: str, original: list[str], thumb: list[str], variant: int, fetched: float) -> None:
+        self.origin_link = origin_link
+        self.original = dumps(original)
+        self.thumb = dumps(thumb)
+        self.variant = variant
+        self.fetched = fetched
@@ -1,20 +1,47 @@
 from __future__ import annotations
 
 import atexit
+from collections.abc import Iterable
+from itertools import islice
+from json import loads
+from time import time
+from typing import TYPE_CHECKING
 
 from os.path import isfile
-from imagehash import ImageHash, ImageMultiHash
-from sqlalchemy import create_engine
+from sqlalchemy import and_, case, create_engine, inspect, or_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
-from saberdb.model import Base, SaberRecord
+from origins import OriginData
+from saberdb.model import (
+    LEGACY_RECORD_TABLE,
+    SCHEMA_VERSION,
+    Base,
+    JobState,
+    MissReason,
+    SaberJob,
+    SaberMiss,
+    SaberOrigin,
+    SaberRecord,
+    encode_hash,
+    encode_md5,
+)
+
+if TYPE_CHECKING:
+    from imagehash import ImageHash, ImageMultiHash
 
 
 class SaberDB:
     def __init__(self, config: SaberDBConfig) -> None:
         self.config = config
-        engine = create_engine(f'sqlite:///{self.config.db_path}')
+        engine = create_engine(f'sqlite:///{self.config.db_path}', connect_args={'timeout': self.config.timeout})
+        if inspect(engine).has_table(LEGACY_RECORD_TABLE):
+            engine.dispose()
+            raise SaberDBOutdatedException(self.config.db_path)
         Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f'PRAGMA user_version = {SCHEMA_VERSION}')
         session = sessionmaker(bind=engine)
         self.db = session()
         atexit.register(self.__cleanup)
@@ -25,24 +52,151 @@ class SaberDB:
             return False, False
         if not isfile(target.path):
             return True, False
-        return True, target.hash == str(hash)
+        return True, target.hash == encode_hash(hash)
 
-    def add(self, item: SaberRecord):
+    def add(self, item: SaberRecord) -> bool:
         self.db.add(item)
-        self.db.commit()
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            return False
+        return True
 
     def get(self, img_hash: ImageHash | ImageMultiHash) -> SaberRecord | None:
-        res = self.db.query(SaberRecord).filter_by(hash=str(img_hash)).one_or_none()
+        res = self.db.query(SaberRecord).filter_by(hash=encode_hash(img_hash)).one_or_none()
+        return res
+
+    def get_by_md5(self, md5: str) -> SaberRecord | None:
+        res = self.db.query(SaberRecord).filter_by(md5=encode_md5(md5)).first()
         return res
 
     def delete(self, img_hash: ImageHash | ImageMultiHash):
-        self.db.query(SaberRecord).filter_by(hash=str(img_hash)).delete()
+        self.db.query(SaberRecord).filter_by(hash=encode_hash(img_hash)).delete()
+        self.db.commit()
+
+    def add_miss(self, hash: ImageHash | ImageMultiHash, md5: str, reason: MissReason):
+        self.db.merge(SaberMiss(hash, md5, reason, time()))
+        self.db.commit()
+
+    def is_missed(self, hash: ImageHash | ImageMultiHash | None, md5: str) -> bool:
+        if self.config.retry_after <= 0:
+            return False
+        since = time() - self.config.retry_after
+        matched = SaberMiss.md5 == md5 if hash is None else or_(SaberMiss.md5 == md5, SaberMiss.hash == str(hash))
+        res = self.db.query(SaberMiss.md5).filter(matched, SaberMiss.checked > since).first()
+        return res is not None
+
+    def delete_miss(self, hash: ImageHash | ImageMultiHash, md5: str):
+        self.db.query(SaberMiss).filter(or_(SaberMiss.md5 == md5, SaberMiss.hash == str(hash))).delete(synchronize_session=False)
+        self.db.commit()
+
+    def get_origin_data(self, origin_link: str, since: float) -> tuple[OriginData, float] | None:
+        res = self.db.query(SaberOrigin).filter(SaberOrigin.origin_link == origin_link, SaberOrigin.fetched > since).one_or_none()
+        if res is None:
+            return None
+        return OriginData(loads(res.original), loads(res.thumb), res.variant), res.fetched
+
+    def put_origin_data(self, origin_link: str, data: OriginData, fetched: float):
+        self.db.merge(SaberOrigin(origin_link, data.original, data.thumb, data.variant, fetched))
         self.db.commit()
 
+    def enqueue(self, paths: Iterable[str], chunk_size: int = 1000) -> int:
+        count = 0
+        it = iter(paths)
+        while True:
+            chunk = list(islice(it, chunk_size))
+            if len(chunk) == 0:
+                break
+            rows = [{'path': p, 'state': JobState.Pending.value, 'lease': 0.0, 'attempts': 0} for p in chunk]
+            res = self.db.execute(insert(SaberJob).values(rows).on_conflict_do_nothing())
+            self.db.commit()
+            count += res.rowcount
+        return count
+
+    def claim(self, owner: str, lease: float, max_attempts: int = 3) -> str | None:
+        self.__fail_exhausted(max_attempts)
+        while True:
+            now = time()
+            claimable = and_(
+                or_(
+                    SaberJob.state == JobState.Pending.value,
+                    and_(SaberJob.state == JobState.Claimed.value, SaberJob.lease < now),
+                ),
+                SaberJob.attempts < max_attempts,
+            )
+            path = self.db.query(SaberJob.path).filter(claimable).limit(1).scalar()
+            if path is None:
+                return None
+            updated = (
+                self.db.query(SaberJob)
+                .filter(SaberJob.path == path, claimable)
+                .update(
+                    {
+                        SaberJob.state: JobState.Claimed.value,
+                        SaberJob.owner: owner,
+                        SaberJob.lease: now + lease,
+                        SaberJob.attempts: SaberJob.attempts + 1,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            self.db.commit()
+            if updated == 1:
+                return path
+
+    def has_open_jobs(self) -> bool:
+        res = (
+            self.db.query(SaberJob.path)
+            .filter(SaberJob.state.in_((JobState.Pending.value, JobState.Claimed.value)))
+            .first()
+        )
+        return res is not None
+
+    def __fail_exhausted(self, max_attempts: int):
+        exhausted = and_(
+            or_(
+                SaberJob.state == JobState.Pending.value,
+                and_(SaberJob.state == JobState.Claimed.value, SaberJob.lease < time()),
+            ),
+            SaberJob.attempts >= max_attempts,
+        )
+        self.db.query(SaberJob).filter(exhausted).update(
+            {SaberJob.state: JobState.Failed.value, SaberJob.lease: 0.0}, synchronize_session=False
+        )
+        self.db.commit()
+
+    def heartbeat(self, path: str, owner: str, lease: float) -> bool:
+        updated = (
+            self.db.query(SaberJob)
+            .filter_by(path=path, owner=owner, state=JobState.Claimed.value)
+            .update({SaberJob.lease: time() + lease}, synchronize_session=False)
+        )
+        self.db.commit()
+        return updated == 1
+
+    def finish(self, path: str, owner: str, state: JobState, max_attempts: int = None) -> bool:
+        new_state = state.value
+        if state == JobState.Failed and max_attempts is not None:
+            new_state = case((SaberJob.attempts < max_attempts, JobState.Pending.value), else_=JobState.Failed.value)
+        updated = (
+            self.db.query(SaberJob)
+            .filter_by(path=path, owner=owner, state=JobState.Claimed.value)
+            .update({SaberJob.state: new_state, SaberJob.lease: 0.0}, synchronize_session=False)
+        )
+        self.db.commit()
+        return updated == 1
+
     def __cleanup(self):
-        self.db.close_all()
+        self.db.close()
+
+
+class SaberDBOutdatedException(BaseException):
+    pass
 
 
 class SaberDBConfig:
-    def __init__(self, db_path: str = 'saberdb.db') -> None:
-        self.db_path = db_path
+    def __init__(self, db_path: str = 'saberdb.db', timeout: float = 30.0, retry_after: float = 30.0) -> None:
+        self.db_path = db_path if db_path else 'saberdb.db'
+        self.timeout = timeout
+        self.retry_after = retry_after * 86400
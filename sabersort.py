@@ -1,16 +1,44 @@
 import asyncio
+import subprocess
+import sys
+from argparse import ArgumentParser
 
 import rtoml
 
-from ascii2d import Ascii2d, Ascii2dConfig, OriginType, SortOrder
+from ascii2d import Ascii2d, Ascii2dConfig, OriginType, SortOrder, UploadMode
 from hasher import HashAlg, Hasher
+from iqdb import Iqdb, IqdbConfig
+from origins.danbooru import Danbooru, DanbooruConfig
+from origins.memo import MemoOrigin
 from origins.pixiv import Pixiv, PixivConfig
 from origins.twitter import Twitter, TwitterConfig
-from saber import Saber, SaberConfig
-from saberdb import SaberDB, SaberDBConfig
+from saber import DownloadConfig, JobConfig, Saber, SaberConfig, Watcher, WatcherConfig
+from saberdb import SaberDB, SaberDBConfig, SaberDBOutdatedException
+from saberdb.migrate import migrate
+from thumbcache import ThumbCache, ThumbCacheConfig
+from utils import MemoryBudget
 
 if __name__ == '__main__':
-    with open('config.toml', 'r') as c:
+    parser = ArgumentParser()
+    parser.add_argument('--config', default='config.toml', help='path to the config file')
+    parser.add_argument('--watch', action='store_true', help='keep running and sort new files as they arrive in the input folder')
+    parser.add_argument('--enqueue', action='store_true', help='add the files in the input folder to the job table of the database')
+    parser.add_argument('--worker', action='store_true', help='claim and sort files from the job table of the database')
+    parser.add_argument('--worker-id', default=None, help='name of this worker in the job table')
+    parser.add_argument('--exit-when-idle', action='store_true', help='stop the worker once no job in the job table is pending or still being worked on')
+    parser.add_argument('--plan', default=None, metavar='PATH', help='only search and match, appending what to download to a JSONL plan')
+    parser.add_argument('--download', default=None, metavar='PATH', help='download everything listed in a JSONL plan')
+    parser.add_argument('--spawn', type=int, default=0, metavar='N', help='enqueue the input folder and run N worker processes until it is done')
+    parser.add_argument('--migrate', action='store_true', help='convert the records of an old database to the current format and exit')
+    args = parser.parse_args()
+
+    if args.spawn > 0:
+        cmd = [sys.executable, sys.argv[0], '--config', args.config]
+        subprocess.run([*cmd, '--enqueue'], check=True)
+        procs = [subprocess.Popen([*cmd, '--worker', '--exit-when-idle']) for _ in range(args.spawn)]
+        sys.exit(max(p.wait() for p in procs))
+
+    with open(args.config, 'r') as c:
         config = rtoml.load(c)
 
     in_dir: str = config['sabersort']['input']
@@ -20,11 +48,29 @@ if __name__ == '__main__':
     fmt: str = config['sabersort']['filename']
     threshold: int = config['sabersort']['threshold']
     user_agent: str = config['sabersort']['user_agent']
-    sabersort_cfg = SaberConfig(in_dir, out_dir, nf_dir, exc_dir, fmt, threshold, user_agent)
+    recursive: bool = config['sabersort'].get('recursive', True)
+    patterns: list[str] = config['sabersort'].get('patterns', [])
+    lookahead: int = config['sabersort'].get('lookahead', 64)
+    workers: int = config['sabersort'].get('workers', 1)
+    memory_budget: float = config['sabersort'].get('memory_budget', 0)
+    searcher_names: list[str] = config['sabersort'].get('searchers', ['ascii2d'])
+    fanout: bool = config['sabersort'].get('fanout', False)
+    budget = MemoryBudget(int(memory_budget * 1024 * 1024))
+    sabersort_cfg = SaberConfig(in_dir, out_dir, nf_dir, exc_dir, fmt, threshold, user_agent, recursive, patterns, lookahead, workers, fanout)
 
     db_path: str = config['saberdb']['database_path']
-    db_cfg = SaberDBConfig(db_path)
-    db = SaberDB(db_cfg)
+    db_timeout: float = config['saberdb'].get('timeout', 30.0)
+    retry_after: float = config['saberdb'].get('retry_after', 30.0)
+    db_cfg = SaberDBConfig(db_path, db_timeout, retry_after)
+    if args.migrate:
+        report = migrate(db_cfg.db_path)
+        print(report if report is not None else 'nothing to migrate')
+        sys.exit()
+    try:
+        db = SaberDB(db_cfg)
+    except SaberDBOutdatedException:
+        sys.exit(f'{db_cfg.db_path} still has records in the old format, run sabersort.py --migrate to convert them first')
+    origin_ttl: float = config['saberdb'].get('origin_ttl', 7.0)
 
     hash_alg = HashAlg.from_str(config['hasher']['hash_algorithm'])
     hash_size: int = config['hasher']['hash_size']
@@ -33,18 +79,83 @@ if __name__ == '__main__':
     prefered = OriginType.from_str(config['ascii2d']['perfered_origin'])
     sort_order = SortOrder.from_str(config['ascii2d']['sort_order'])
     first: int = config['ascii2d']['first']
-    ascii2d_cfg = Ascii2dConfig(user_agent, sort_order, first, prefered)
-    ascii2d = Ascii2d(ascii2d_cfg)
+    base_url: str = config['ascii2d'].get('base_url', 'https://ascii2d.net')
+    upload_mode = UploadMode.from_str(config['ascii2d'].get('upload_mode', 'original'))
+    upload_max_size: int = config['ascii2d'].get('upload_max_size', 1000)
+    upload_quality: int = config['ascii2d'].get('upload_quality', 90)
+    aspect_tolerance: float = config['ascii2d'].get('aspect_tolerance', 0.1)
+    ascii2d_cfg = Ascii2dConfig(user_agent, sort_order, first, prefered, base_url, upload_mode, upload_max_size, upload_quality, aspect_tolerance)
+    ascii2d = Ascii2d(ascii2d_cfg, budget)
+
+    iqdb_section: dict = config.get('iqdb', {})
+    iqdb_prefered = OriginType.from_str(iqdb_section.get('perfered_origin', 'Danbooru'))
+    iqdb_base_url: str = iqdb_section.get('base_url', 'https://iqdb.org')
+    min_similarity: float = iqdb_section.get('min_similarity', 80.0)
+    iqdb_upload_mode = UploadMode.from_str(iqdb_section.get('upload_mode', 'downscale'))
+    iqdb_upload_max_size: int = iqdb_section.get('upload_max_size', 1000)
+    iqdb_upload_quality: int = iqdb_section.get('upload_quality', 90)
+    iqdb_aspect_tolerance: float = iqdb_section.get('aspect_tolerance', 0.1)
+    danbooru_section: dict = config.get('danbooru', {})
+    danbooru_url: str = danbooru_section.get('base_url', 'https://danbooru.donmai.us')
+    iqdb_cfg = IqdbConfig(
+        user_agent,
+        iqdb_prefered,
+        iqdb_base_url,
+        min_similarity,
+        iqdb_upload_mode,
+        iqdb_upload_max_size,
+        iqdb_upload_quality,
+        iqdb_aspect_tolerance,
+        danbooru_url,
+    )
+
+    available_searchers = {'ascii2d': ascii2d, 'iqdb': Iqdb(iqdb_cfg, budget)}
+    unknown = [name for name in searcher_names if name.lower() not in available_searchers]
+    if len(searcher_names) == 0 or len(unknown) > 0:
+        parser.error(f"[sabersort] searchers must list at least one of {', '.join(available_searchers)}")
+    searchers = [available_searchers[name.lower()] for name in searcher_names]
 
     phpsessid: str = config['pixiv']['PHPSESSID']
     pixiv_cfg = PixivConfig(phpsessid, user_agent)
-    pixiv = Pixiv(pixiv_cfg)
+    pixiv = MemoOrigin(Pixiv(pixiv_cfg), db, origin_ttl)
 
     auth_token: str = config['twitter']['auth_token']
     headless: bool = config['twitter']['headless']
     twitter_cfg = TwitterConfig(auth_token, user_agent, headless)
-    twitter = Twitter(twitter_cfg)
+    twitter = MemoOrigin(Twitter(twitter_cfg), db, origin_ttl)
+
+    danbooru_cfg = DanbooruConfig(user_agent, danbooru_url)
+    danbooru = MemoOrigin(Danbooru(danbooru_cfg), db, origin_ttl)
+
+    cache_section: dict = config.get('cache', {})
+    cache_dir: str = cache_section.get('path', '')
+    cache_size: float = cache_section.get('max_size', 256)
+    cache = ThumbCache(ThumbCacheConfig(cache_dir, int(cache_size * 1024 * 1024)))
 
-    saber = Saber(sabersort_cfg, ascii2d, hasher, db, pixiv, twitter)
+    saber = Saber(sabersort_cfg, searchers, hasher, db, pixiv, twitter, budget, cache, danbooru)
 
-    asyncio.run(saber.sort())
+    if args.plan is not None:
+        asyncio.run(saber.plan(args.plan))
+    elif args.download is not None:
+        download_section: dict = config.get('download', {})
+        download_workers: int = download_section.get('workers', 8)
+        per_host: int = download_section.get('per_host', 2)
+        asyncio.run(saber.download(args.download, DownloadConfig(download_workers, per_host)))
+    elif args.enqueue:
+        print(f'{saber.enqueue()} files enqueued')
+    elif args.worker:
+        jobs_section: dict = config.get('jobs', {})
+        lease: float = jobs_section.get('lease', 120.0)
+        poll: float = jobs_section.get('poll', 5.0)
+        max_attempts: int = jobs_section.get('max_attempts', 3)
+        job_cfg = JobConfig(args.worker_id, lease, poll, max_attempts, args.exit_when_idle)
+        asyncio.run(saber.work(job_cfg))
+    elif args.watch:
+        watch_section: dict = config.get('watch', {})
+        interval: float = watch_section.get('interval', 5.0)
+        settle: float = watch_section.get('settle', 2.0)
+        use_inotify: bool = watch_section.get('inotify', True)
+        watcher = Watcher(WatcherConfig(interval, settle, use_inotify))
+        asyncio.run(saber.watch(watcher))
+    else:
+        asyncio.run(saber.sort())
@@ -0,0 +1 @@
+from .searcher import Searcher, UploadMode, rank_by_geometry, read_upload
\ No newline at end of file
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import math
+from abc import ABCMeta, abstractmethod
+from enum import Enum
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from PIL import Image
+
+if TYPE_CHECKING:
+    from ascii2d import Ascii2dResult
+    from origins import OriginType
+
+RESOLUTION_WEIGHT = 0.25
+NON_PREFERED_PENALTY = 0.5
+
+
+class Searcher(metaclass=ABCMeta):
+    @abstractmethod
+    async def search(self, img_path: str | Path, md5: str = None) -> list[Ascii2dResult]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def rank_results(self, results: list[Ascii2dResult], width: int, height: int) -> list[Ascii2dResult]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def fetch_thumbnail(self, target: Ascii2dResult) -> BytesIO:
+        raise NotImplementedError
+
+
+def rank_by_geometry(
+    results: list[Ascii2dResult],
+    width: int,
+    height: int,
+    prefered: OriginType,
+    tolerance: float,
+) -> list[Ascii2dResult]:
+    if width <= 0 or height <= 0:
+        return list(results)
+    src_ratio = math.log(width / height)
+    src_size = width * height
+    scored: list[tuple[float, Ascii2dResult]] = []
+    for r in results:
+        if r.width <= 0 or r.height <= 0:
+            continue
+        aspect_diff = abs(math.log(r.width / r.height) - src_ratio)
+        if tolerance > 0 and aspect_diff > tolerance:
+            continue
+        score = aspect_diff / tolerance if tolerance > 0 else aspect_diff
+        score += RESOLUTION_WEIGHT * max(0.0, math.log(src_size / (r.width * r.height)))
+        if r.origin != prefered:
+            score += NON_PREFERED_PENALTY
+        scored.append((score, r))
+    scored.sort(key=lambda s: s[0])
+    return [r for _, r in scored]
+
+
+def read_upload(img_path: str | Path, mode: UploadMode, max_size: int, quality: int) -> bytes:
+    match mode:
+        case UploadMode.Original:
+            return Path(img_path).read_bytes()
+        case UploadMode.Downscale:
+            with Image.open(img_path) as img:
+                if max(img.size) <= max_size and img.format in ('JPEG', 'PNG', 'WEBP', 'GIF'):
+                    return Path(img_path).read_bytes()
+                img.draft('RGB', (max_size, max_size))
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    img = img.convert('RGBA')
+                    background = Image.new('RGB', img.size, (255, 255, 255))
+                    background.paste(img, mask=img.getchannel('A'))
+                    img = background
+                elif img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.thumbnail((max_size, max_size), Image.LANCZOS)
+                buf = BytesIO()
+                img.save(buf, 'JPEG', quality=quality)
+                return buf.getvalue()
+
+
+class UploadMode(Enum):
+    Original = 'original'
+    Downscale = 'downscale'
+
+    @classmethod
+    def from_str(cls, s: str):
+        for o in cls:
+            if o.value == s.lower():
+                return o
+        raise ValueError
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from io import BytesIO
+
+import numpy
+from aiohttp import web
+from PIL import Image
+
+
+def random_image(seed: int, width: int = 200, height: int = 300) -> Image.Image:
+    rng = numpy.random.default_rng(seed)
+    return Image.fromarray((rng.random((height, width, 3)) * 255).astype('uint8'))
+
+
+def png_bytes(img: Image.Image) -> bytes:
+    buf = BytesIO()
+    img.save(buf, 'PNG')
+    return buf.getvalue()
+
+
+@asynccontextmanager
+async def serve(app: web.Application) -> AsyncIterator[str]:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        await runner.cleanup()
+
+
+class StandIn:
+    def __init__(self, delay: float = 0.0, drop_first: int = 0) -> None:
+        self.delay = delay
+        self.drop_first = drop_first
+        self.url = ''
+        self.requests = 0
+        self.images = dict[str, bytes]()
+
+    def app(self) -> web.Application:
+        raise NotImplementedError
+
+    async def _wait(self, request: web.Request):
+        self.requests += 1
+        if self.requests <= self.drop_first:
+            request.transport.abort()
+            raise web.HTTPServiceUnavailable
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+
+    async def _image(self, request: web.Request) -> web.Response:
+        data = self.images.get(request.match_info['name'])
+        if data is None:
+            raise web.HTTPNotFound
+        return web.Response(body=data, content_type='image/png')
+
+
+class DanbooruStandIn(StandIn):
+    def __init__(self, posts: dict[str, tuple[Image.Image, str]], delay: float = 0.0, drop_first: int = 0) -> None:
+        super().__init__(delay, drop_first)
+        self.posts = posts
+        for post_id, (img, _) in posts.items():
+            self.images[f'{post_id}.png'] = png_bytes(img)
+            self.images[f'{post_id}-preview.png'] = png_bytes(img.resize((img.width // 2, img.height // 2)))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/posts/{id}.json', self.__post)
+        app.router.add_get('/data/{name}', self._image)
+        return app
+
+    async def __post(self, request: web.Request) -> web.Response:
+        await self._wait(request)
+        post_id = request.match_info['id']
+        if post_id not in self.posts:
+            raise web.HTTPNotFound
+        img, artist = self.posts[post_id]
+        return web.json_response(
+            {
+                'id': int(post_id),
+                'md5': f'{int(post_id):032x}',
+                'file_ext': 'png',
+                'file_size': len(self.images[f'{post_id}.png']),
+                'image_width': img.width,
+                'image_height': img.height,
+                'tag_string_artist': artist,
+                'tag_string_copyright': 'original',
+                'file_url': f'{self.url}/data/{post_id}.png',
+                'preview_file_url': f'{self.url}/data/{post_id}-preview.png',
+            }
+        )
+
+
+class IqdbStandIn(StandIn):
+    def __init__(
+        self, danbooru: DanbooruStandIn, post_ids: str | list[str], similarity: float = 95.0, delay: float = 0.0, drop_first: int = 0
+    ) -> None:
+        super().__init__(delay, drop_first)
+        self.danbooru = danbooru
+        self.post_ids = post_ids if isinstance(post_ids, list) else [post_ids]
+        self.similarity = similarity
+        for post_id in self.post_ids:
+            img, _ = danbooru.posts[post_id]
+            self.images[f'{post_id}.png'] = png_bytes(img.resize((img.width // 2, img.height // 2)))
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/', self.__search)
+        app.router.add_get('/thu/{name}', self._image)
+        return app
+
+    async def __search(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        if 'file' not in data:
+            raise web.HTTPBadRequest
+        await self._wait(request)
+        tables = list[str]()
+        for post_id in self.post_ids:
+            img, _ = self.danbooru.posts[post_id]
+            tables.append(f'''<div><table><tr><th>Best match</th></tr>
+<tr><td class="image"><a href="{self.danbooru.url}/posts/{post_id}"><img src="/thu/{post_id}.png"></a></td></tr>
+<tr><td><img class="service-icon" src="/icon/danbooru.ico">Danbooru</td></tr>
+<tr><td>{img.width}×{img.height} [Safe]</td></tr>
+<tr><td>{self.similarity:.0f}% similarity</td></tr></table></div>''')
+        html = f'''<html><body><div id="pages">
+<div><table><tr><th>Your image</th></tr><tr><td class="image"><img src="/thu/upload.jpg"></td></tr></table></div>
+{''.join(tables)}
+</div></body></html>'''
+        return web.Response(text=html, content_type='text/html')
+
+
+class Ascii2dStandIn(StandIn):
+    def __init__(self, danbooru: DanbooruStandIn, post_id: str, thumbnail: Image.Image, delay: float = 0.0) -> None:
+        super().__init__(delay)
+        self.danbooru = danbooru
+        self.post_id = post_id
+        self.thumbnail = thumbnail
+        self.images['thumb.png'] = png_bytes(thumbnail)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/search/color/{md5}', self.__search)
+        app.router.add_post('/search/file', self.__search)
+        app.router.add_get('/thumbnail/{name}', self._image)
+        return app
+
+    async def __search(self, request: web.Request) -> web.Response:
+        await self._wait(request)
+        html = f'''<html><body>
+<div class="row item-box">
+<div class="image-box"><img src="/thumbnail/thumb.png"></div>
+<div class="info-box">
+<div class="hash">{'0' * 32}</div>
+<small class="text-muted">{self.thumbnail.width}x{self.thumbnail.height} PNG 120.5KB</small>
+<div class="detail-box gray-link"><h6><img src="/icons/danbooru.png" alt="danbooru">
+<a href="{self.danbooru.url}/posts/{self.post_id}">title {self.post_id}</a>
+<a href="{self.danbooru.url}/posts?tags=artist_{self.post_id}">artist_{self.post_id}</a></h6></div>
+</div></div>
+</body></html>'''
+        return web.Response(text=html, content_type='text/html')
+
+
+@asynccontextmanager
+async def serve_all(*standins: StandIn) -> AsyncIterator[None]:
+    async with AsyncExitStack() as stack:
+        for standin in standins:
+            standin.url = await stack.enter_async_context(serve(standin.app()))
+        yield
@@ -0,0 +1,68 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import rtoml
+
+from saberdb import SaberDB, SaberDBConfig
+from saberdb.model import JobState, SaberJob
+from standins import DanbooruStandIn, IqdbStandIn, random_image, serve_all
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def write_config(tmp_path: Path, iqdb: IqdbStandIn, danbooru: DanbooruStandIn) -> Path:
+    config = {
+        'sabersort': {
+            'input': str(tmp_path / 'in'),
+            'found': str(tmp_path / 'out'),
+            'not_found': str(tmp_path / 'nf'),
+            'exception': str(tmp_path / 'ex'),
+            'filename': '{origin}-{author_id}-{id}',
+            'threshold': 10,
+            'user_agent': 'sabersort-test',
+            'searchers': ['iqdb'],
+        },
+        'saberdb': {'database_path': str(tmp_path / 'saberdb.db'), 'retry_after': 0.0},
+        'hasher': {'hash_algorithm': 'Perceptual', 'hash_size': 16},
+        'cache': {'path': ''},
+        'ascii2d': {'perfered_origin': 'Pixiv', 'sort_order': 'No', 'first': 0},
+        'iqdb': {'base_url': iqdb.url},
+        'danbooru': {'base_url': danbooru.url},
+        'pixiv': {'PHPSESSID': ''},
+        'twitter': {'auth_token': '', 'headless': True},
+        'jobs': {'lease': 10.0, 'poll': 0.2, 'max_attempts': 3},
+    }
+    path = tmp_path / 'config.toml'
+    path.write_text(rtoml.dumps(config))
+    return path
+
+
+def test_spawned_workers_retry_transient_failures(tmp_path):
+    count = 6
+    for name in ('in', 'out', 'nf', 'ex'):
+        tmp_path.joinpath(name).mkdir()
+    posts = dict[str, tuple]()
+    for i in range(count):
+        img = random_image(100 + i)
+        img.save(tmp_path / 'in' / f'{i}.png')
+        posts[str(i + 1)] = (img, f'artist_{i + 1}')
+    danbooru = DanbooruStandIn(posts)
+    iqdb = IqdbStandIn(danbooru, list(posts), drop_first=2)
+
+    async def run():
+        async with serve_all(danbooru, iqdb):
+            config = write_config(tmp_path, iqdb, danbooru)
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, str(ROOT / 'sabersort.py'), '--config', str(config), '--spawn', '3', cwd=tmp_path
+            )
+            return await asyncio.wait_for(proc.wait(), 120)
+
+    assert asyncio.run(run()) == 0
+    assert sorted(p.name for p in tmp_path.joinpath('out').iterdir()) == [f'danbooru-artist_{i}-{i}.png' for i in range(1, count + 1)]
+    assert iqdb.requests == count + 2
+    db = SaberDB(SaberDBConfig(str(tmp_path / 'saberdb.db')))
+    jobs = db.db.query(SaberJob).all()
+    assert len(jobs) == count
+    assert all(j.state == JobState.Done.value for j in jobs)
+    assert sorted(j.attempts for j in jobs) == [1] * (count - 2) + [2, 2]
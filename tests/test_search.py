@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+from ascii2d import Ascii2d, Ascii2dConfig, OriginType
+from hasher import HashAlg, Hasher
+from iqdb import Iqdb, IqdbConfig
+from origins.danbooru import Danbooru, DanbooruConfig
+from saber import Saber, SaberConfig
+from saberdb import SaberDB, SaberDBConfig
+from searcher import Searcher
+from standins import Ascii2dStandIn, DanbooruStandIn, IqdbStandIn, random_image, serve_all
+
+SOURCE = random_image(1)
+OTHER = random_image(2)
+
+
+class RecordingSearcher(Searcher):
+    def __init__(self, inner: Searcher) -> None:
+        self.inner = inner
+        self.cancelled = False
+
+    async def search(self, img_path, md5=None):
+        try:
+            return await self.inner.search(img_path, md5)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+    def rank_results(self, results, width, height):
+        return self.inner.rank_results(results, width, height)
+
+    async def fetch_thumbnail(self, target):
+        return await self.inner.fetch_thumbnail(target)
+
+
+def make_saber(tmp_path, searchers, danbooru: DanbooruStandIn, fanout: bool = False) -> Saber:
+    for name in ('in', 'out', 'nf', 'ex'):
+        tmp_path.joinpath(name).mkdir()
+    SOURCE.save(tmp_path / 'in' / 'source.png')
+    config = SaberConfig(
+        tmp_path / 'in', tmp_path / 'out', tmp_path / 'nf', tmp_path / 'ex', '{origin}-{author_id}-{id}', 10, fanout=fanout
+    )
+    db = SaberDB(SaberDBConfig(str(tmp_path / 'saberdb.db')))
+    origin = Danbooru(DanbooruConfig(base_url=danbooru.url))
+    return Saber(config, searchers, Hasher(HashAlg.Perceptual, 16), db, None, None, danbooru=origin)
+
+
+def test_ascii2d_normalizes_results(tmp_path):
+    danbooru = DanbooruStandIn({'1': (SOURCE, 'artist_a')})
+    ascii2d_standin = Ascii2dStandIn(danbooru, '1', SOURCE)
+    SOURCE.save(tmp_path / 'source.png')
+
+    async def run():
+        async with serve_all(danbooru, ascii2d_standin):
+            return await Ascii2d(Ascii2dConfig(base_url=ascii2d_standin.url)).search(tmp_path / 'source.png', '0' * 32)
+
+    results = asyncio.run(run())
+    assert len(results) == 1
+    r = results[0]
+    assert r.origin == OriginType.Danbooru
+    assert r.orig_link == f'{danbooru.url}/posts/1'
+    assert r.thumbnail_link == f'{ascii2d_standin.url}/thumbnail/thumb.png'
+    assert (r.width, r.height, r.extension, r.id) == (SOURCE.width, SOURCE.height, 'png', '1')
+
+
+def test_iqdb_normalizes_results(tmp_path):
+    danbooru = DanbooruStandIn({'7': (SOURCE, 'artist_b other_artist')})
+    iqdb_standin = IqdbStandIn(danbooru, '7')
+    SOURCE.save(tmp_path / 'source.png')
+
+    async def run():
+        async with serve_all(danbooru, iqdb_standin):
+            iqdb = Iqdb(IqdbConfig(base_url=iqdb_standin.url, danbooru_url=danbooru.url))
+            return await iqdb.search(tmp_path / 'source.png')
+
+    results = asyncio.run(run())
+    assert len(results) == 1
+    r = results[0]
+    assert r.origin == OriginType.Danbooru
+    assert r.orig_link == f'{danbooru.url}/posts/7'
+    assert r.thumbnail_link == f'{iqdb_standin.url}/thu/7.png'
+    assert (r.author, r.author_id, r.title, r.id) == ('artist_b', 'artist_b', 'original', '7')
+    assert (r.width, r.height, r.extension, r.md5) == (SOURCE.width, SOURCE.height, 'png', f'{7:032x}')
+
+
+def test_iqdb_skips_low_similarity(tmp_path):
+    danbooru = DanbooruStandIn({'7': (SOURCE, 'artist_b')})
+    iqdb_standin = IqdbStandIn(danbooru, '7', similarity=40)
+    SOURCE.save(tmp_path / 'source.png')
+
+    async def run():
+        async with serve_all(danbooru, iqdb_standin):
+            iqdb = Iqdb(IqdbConfig(base_url=iqdb_standin.url, danbooru_url=danbooru.url, min_similarity=80))
+            return await iqdb.search(tmp_path / 'source.png')
+
+    assert asyncio.run(run()) == []
+
+
+def test_sequential_fallback(tmp_path):
+    danbooru = DanbooruStandIn({'1': (OTHER, 'artist_a'), '2': (SOURCE, 'artist_b')})
+    ascii2d_standin = Ascii2dStandIn(danbooru, '1', OTHER)
+    iqdb_standin = IqdbStandIn(danbooru, '2')
+
+    async def run():
+        async with serve_all(danbooru, ascii2d_standin, iqdb_standin):
+            ascii2d = Ascii2d(Ascii2dConfig(base_url=ascii2d_standin.url))
+            iqdb = Iqdb(IqdbConfig(base_url=iqdb_standin.url, danbooru_url=danbooru.url))
+            saber = make_saber(tmp_path, [ascii2d, iqdb], danbooru)
+            await asyncio.wait_for(saber.sort(), 30)
+
+    asyncio.run(run())
+    assert ascii2d_standin.requests == 1
+    assert iqdb_standin.requests == 1
+    assert [p.name for p in tmp_path.joinpath('out').iterdir()] == ['danbooru-artist_b-2.png']
+    assert list(tmp_path.joinpath('nf').iterdir()) == []
+
+
+def test_fanout_cancels_loser(tmp_path):
+    delay = 5.0
+    danbooru = DanbooruStandIn({'1': (SOURCE, 'artist_a'), '2': (SOURCE, 'artist_b')})
+    ascii2d_standin = Ascii2dStandIn(danbooru, '1', SOURCE, delay=delay)
+    iqdb_standin = IqdbStandIn(danbooru, '2')
+
+    async def run():
+        async with serve_all(danbooru, ascii2d_standin, iqdb_standin):
+            ascii2d = RecordingSearcher(Ascii2d(Ascii2dConfig(base_url=ascii2d_standin.url)))
+            iqdb = RecordingSearcher(Iqdb(IqdbConfig(base_url=iqdb_standin.url, danbooru_url=danbooru.url)))
+            saber = make_saber(tmp_path, [ascii2d, iqdb], danbooru, fanout=True)
+            start = time.monotonic()
+            await asyncio.wait_for(saber.sort(), 30)
+            return time.monotonic() - start, ascii2d, iqdb
+
+    elapsed, ascii2d, iqdb = asyncio.run(run())
+    assert elapsed < delay
+    assert ascii2d.cancelled
+    assert not iqdb.cancelled
+    assert [p.name for p in tmp_path.joinpath('out').iterdir()] == ['danbooru-artist_b-2.png']
@@ -0,0 +1 @@
+from .thumbcache import ThumbCache, ThumbCacheConfig
\ No newline at end of file
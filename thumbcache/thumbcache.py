@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import OrderedDict
+from hashlib import sha256
+from pathlib import Path
+from uuid import uuid4
+
+
+class ThumbCache:
+    def __init__(self, config: ThumbCacheConfig) -> None:
+        self.config = config
+        self.__index = OrderedDict[str, int]()
+        self.__size = 0
+        self.__loaded = False
+        self.__lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.cache_dir is not None and self.config.max_size > 0
+
+    async def get(self, url: str, tag: str) -> tuple[bytes | None, str | None]:
+        if not self.enabled:
+            return None, None
+        key = url_key(url)
+        async with self.__lock:
+            await self.__load()
+            if key not in self.__index:
+                return None, None
+            self.__index.move_to_end(key)
+        try:
+            data, hash_str = await asyncio.to_thread(self.__read, key, tag)
+        except FileNotFoundError:
+            async with self.__lock:
+                self.__size -= self.__index.pop(key, 0)
+            return None, None
+        return data, hash_str
+
+    async def put(self, url: str, data: bytes, tag: str = None, hash_str: str = None):
+        if not self.enabled:
+            return
+        key = url_key(url)
+        try:
+            size = await asyncio.to_thread(self.__write, key, data, tag, hash_str)
+        except OSError:
+            return
+        async with self.__lock:
+            await self.__load()
+            self.__size += size - self.__index.pop(key, 0)
+            self.__index[key] = size
+            evicted = list[str]()
+            while self.__size > self.config.max_size and len(self.__index) > 1:
+                old_key, old_size = self.__index.popitem(last=False)
+                self.__size -= old_size
+                evicted.append(old_key)
+        if len(evicted) > 0:
+            await asyncio.to_thread(self.__remove, evicted)
+
+    async def __load(self):
+        if self.__loaded:
+            return
+        entries = await asyncio.to_thread(self.__scan)
+        for key, (size, _) in sorted(entries.items(), key=lambda e: e[1][1]):
+            self.__index[key] = size
+            self.__size += size
+        self.__loaded = True
+
+    def __path(self, key: str) -> Path:
+        return self.config.cache_dir.joinpath(key[:2], key)
+
+    def __scan(self) -> dict[str, tuple[int, int]]:
+        entries = dict[str, tuple[int, int]]()
+        if not self.config.cache_dir.is_dir():
+            return entries
+        for sub in os.scandir(self.config.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat()
+                key = entry.name.split('.')[0]
+                size, mtime = entries.get(key, (0, 0))
+                entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime_ns))
+        return entries
+
+    def __read(self, key: str, tag: str) -> tuple[bytes, str | None]:
+        path = self.__path(key)
+        data = path.read_bytes()
+        os.utime(path)
+        try:
+            hash_str = path.with_name(f'{key}.{tag}').read_text()
+        except FileNotFoundError:
+            hash_str = None
+        return data, hash_str
+
+    def __write(self, key: str, data: bytes, tag: str, hash_str: str) -> int:
+        path = self.__path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, data)
+        size = len(data)
+        if tag is not None and hash_str is not None:
+            encoded = hash_str.encode()
+            write_atomic(path.with_name(f'{key}.{tag}'), encoded)
+            size += len(encoded)
+        return size
+
+    def __remove(self, keys: list[str]):
+        for key in keys:
+            path = self.__path(key)
+            for p in path.parent.glob(f'{key}*'):
+                p.unlink(missing_ok=True)
+
+
+def url_key(url: str) -> str:
+    return sha256(url.encode()).hexdigest()
+
+
+def write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(f'{path.name}.{os.getpid()}-{uuid4().hex}.tmp')
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class ThumbCacheConfig:
+    def __init__(self, cache_dir: str | Path = None, max_size: int = 256 * 1024 * 1024) -> None:
+        if cache_dir:
+            self.cache_dir = cache_dir if isinstance(cache_dir, Path) else Path(cache_dir)
+        else:
+            self.cache_dir = None
+        self.max_size = max_size
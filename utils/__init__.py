@@ -1 +1,3 @@
-from .utils import split_list, async_copyfile, async_copyfileobj, async_write_file, is_identical, get_bias
\ No newline at end of file
+from .utils import split_list, async_copyfile, async_copyfileobj, async_write_file, file_md5, is_identical, get_bias
+from .scanner import scan_files
+from .budget import MemoryBudget, file_image_cost, image_cost
\ No newline at end of file
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from PIL import Image
+
+
+class MemoryBudget:
+    def __init__(self, limit: int = 0) -> None:
+        self.limit = limit
+        self.used = 0
+        self.__cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, cost: int) -> AsyncIterator[None]:
+        if self.limit <= 0:
+            yield
+            return
+        cost = min(max(cost, 0), self.limit)
+        async with self.__cond:
+            await self.__cond.wait_for(lambda: self.used + cost <= self.limit)
+            self.used += cost
+        try:
+            yield
+        finally:
+            async with self.__cond:
+                self.used -= cost
+                self.__cond.notify_all()
+
+
+def image_cost(img: Image.Image) -> int:
+    width, height = img.size
+    return width * height * (len(img.getbands()) + 1)
+
+
+def file_image_cost(path: str | Path) -> int:
+    with Image.open(path) as img:
+        return image_cost(img)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Iterable, Iterator
+from fnmatch import fnmatch
+from pathlib import Path
+
+
+def scan_files(
+    root: str | Path,
+    patterns: Iterable[str] = (),
+    recursive: bool = True,
+    exclude: Iterable[str | Path] = (),
+) -> Iterator[os.DirEntry]:
+    patterns = [normalize_pattern(p) for p in patterns]
+    excluded = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+    stack = [os.fspath(root)]
+    while stack:
+        current = stack.pop()
+        try:
+            it = os.scandir(current)
+        except OSError:
+            continue
+        subdirs = list[str]()
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and os.path.normcase(os.path.abspath(entry.path)) not in excluded:
+                            subdirs.append(entry.path)
+                    elif entry.is_file() and is_matched(entry.name, patterns):
+                        yield entry
+                except OSError:
+                    continue
+        stack.extend(reversed(subdirs))
+
+
+def is_matched(name: str, patterns: list[str]) -> bool:
+    if len(patterns) == 0:
+        return True
+    name = name.lower()
+    return any(fnmatch(name, p) for p in patterns)
+
+
+def normalize_pattern(pattern: str) -> str:
+    pattern = pattern.lower()
+    if not any(c in pattern for c in '*?['):
+        pattern = f'*.{pattern.lstrip(".")}'
+    return pattern
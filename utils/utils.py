@@ -1,10 +1,17 @@
+from __future__ import annotations
+
+from hashlib import md5
 from io import BufferedIOBase
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from pathlib import Path
 
 import aiofiles
-from aiofiles.threadpool.binary import AsyncBufferedIOBase
-from imagehash import ImageHash, ImageMultiHash
+
+from hasher.multihash import multihash_diff
+
+if TYPE_CHECKING:
+    from aiofiles.threadpool.binary import AsyncBufferedIOBase
+    from imagehash import ImageHash, ImageMultiHash
 
 
 def split_list(list_: list[Any], n: int) -> list[list[Any]]:
@@ -36,14 +43,30 @@ async def async_write_file(src: BufferedIOBase, dist: AsyncBufferedIOBase):
         await dist.write(chunk)
 
 
+def file_md5(path: str | Path, chunk_size: int = 1 << 20) -> str:
+    md5_hash = md5()
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        while n := f.readinto(buf):
+            md5_hash.update(view[:n])
+    return md5_hash.hexdigest()
+
+
 def is_identical(hash_1: ImageHash | ImageMultiHash, hash_2: ImageHash | ImageMultiHash, threshold: int = 0) -> bool:
+    from imagehash import ImageMultiHash
+
+    if isinstance(hash_1, ImageMultiHash) and isinstance(hash_2, ImageMultiHash):
+        return multihash_diff(hash_1, hash_2, threshold)[1] <= threshold
     return get_bias(hash_1, hash_2) <= threshold
 
 
 def get_bias(hash_1: ImageHash | ImageMultiHash, hash_2: ImageHash | ImageMultiHash) -> int:
+    from imagehash import ImageHash, ImageMultiHash
+
     if isinstance(hash_1, ImageHash) and isinstance(hash_2, ImageHash):
         return abs(hash_1 - hash_2)
     elif isinstance(hash_1, ImageMultiHash) and isinstance(hash_2, ImageMultiHash):
-        return hash_1.hash_diff(hash_2)[1]
+        return multihash_diff(hash_1, hash_2)[1]
     else:
         raise TypeError